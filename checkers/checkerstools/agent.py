@@ -3,6 +3,20 @@ import pickle
 import os
 import numpy as np
 
+from checkerstools.features import NUM_FEATURES, get_features
+from checkerstools.qtable import QTable
+
+def has_old_keys(Q):
+    """
+    Whether a {state: {action: value}} Q dictionary is still keyed by the old decimal
+    board keys, which do not fit in 64 bits, or by tuple moves.
+    """
+    for s, actions in Q.items():
+        if actions:
+            return s >= 1 << 64 or isinstance(next(iter(actions)), tuple)
+    return False
+
+
 class Learner:
     """
     A class to be inherited by any class representing a checkers player.
@@ -10,7 +24,7 @@ class Learner:
     without worry of crashing (e.g. play_n_games).
     """
 
-    def __init__(self, alpha, gamma, eps, eps_decay = 0.):
+    def __init__(self, alpha, gamma, eps, eps_decay = 0., sparse=False):
         # Agent parameters
         self.alpha = alpha
         self.gamma = gamma
@@ -23,10 +37,10 @@ class Learner:
         self.HEIGHT = 8
         self.WIDTH = 4
 
-        # Initialize Q table to empty list to hold state-action pairs.
-        # Access value for state s, action (move, piece) via Q[s][a]
-        self.Q = {}
-        self.C = {}
+        # Initialize Q table to hold state-action pairs (see qtable.py). A sparse table
+        # only stores the values that have been updated.
+        # Access value for state s, action (a move code, see moves.py) via Q.get(s, a)
+        self.Q = QTable(sparse=sparse)
         # Keep a list of reward received at each episode
         self.rewards = []
     
@@ -51,16 +65,12 @@ class Learner:
 
         Parameters
         ----------
-        s : string
+        s : int
             state
+        possible_actions : list
+            move codes (see moves.py) of the legal moves in state "s"
         """
-        try:
-            values = np.array([self.Q[s][tuple([tuple(a[0]), tuple(a[1])])] for a in possible_actions])
-        except KeyError:
-            self.Q[s] = {}
-            for a in possible_actions:
-                self.Q[s][tuple([tuple(a[0]), tuple(a[1])])] = 0
-            values = np.array([self.Q[s][tuple([tuple(a[0]), tuple(a[1])])] for a in possible_actions])
+        values = self.Q.get_values(s, possible_actions)
         # Find location of max
         ix_max = np.where(values == np.max(values))[0]
         if random.random() < self.eps:
@@ -83,6 +93,14 @@ class Learner:
             self.target_trajectory.append(traj)
 
         return action
+
+    def rank_actions(self, s, possible_actions):
+        """
+        Gets the possible actions in state "s" sorted from the highest Q-value to the
+        lowest, i.e. the greedy action first, without changing the Q-table.
+        """
+        values = self.Q.get_row(s)
+        return sorted(possible_actions, key=lambda a: -values.get(a, 0))
     
     def compute_cum_rewards(self, gamma, t, rewards) -> float:
         """Cumulative reward function"""
@@ -91,6 +109,38 @@ class Learner:
             cum_reward += gamma ** (tau - t) * rewards[tau]
         return cum_reward
 
+    def __getstate__(self):
+        """
+        Leaves the Game the agent is playing (see set_board) out of its pickle.
+        """
+        state = self.__dict__.copy()
+        state.pop('board', None)
+        return state
+
+    def __setstate__(self, state):
+        """
+        Moves the Q and C dictionaries of agents pickled before Q-tables were kept in
+        arrays into a QTable. Tables still keyed by old decimal keys and tuple moves are
+        left for convertkeys.py.
+        """
+        self.__dict__.update(state)
+        if isinstance(self.Q, dict) and not has_old_keys(self.Q):
+            self.Q = QTable.from_dicts(self.Q, state.get('C'))
+            self.__dict__.pop('C', None)
+
+    def get_memory_usage(self):
+        """
+        Gets the size of the Q-table (see QTable.get_memory_usage).
+        """
+        return self.Q.get_memory_usage()
+
+    def compact(self):
+        """
+        Strips the zero valued entries from the Q-table, which makes it sparse (see
+        qtable.py). Returns the number of entries removed.
+        """
+        return self.Q.compact(strip_zeros=True)
+
     def save(self, path):
         """ Pickle the agent object instance to save the agent's state. """
         if os.path.isfile(path):
@@ -116,8 +166,8 @@ class Qlearner(Learner):
     """
     A class to implement the Q-learning agent.
     """
-    def __init__(self, alpha, gamma, eps, eps_decay=0.):
-        super().__init__(alpha, gamma, eps, eps_decay)
+    def __init__(self, alpha, gamma, eps, eps_decay=0., sparse=False):
+        super().__init__(alpha, gamma, eps, eps_decay, sparse)
     
 
     def update(self, s, s_, a, a_, r, possible_actions):
@@ -130,27 +180,25 @@ class Qlearner(Learner):
             previous state
         s_ : int
             new state
-        a : (i,j) tuple
-            previous action
-        a_ : (i,j) tuple
+        a : int
+            previous action (a move code)
+        a_ : int
             new action. NOT used by Q-learner!
         r : int
             reward received after executing action "a" in state "s"
         possible_actions : list
             list of possible actions from state "s".
         """
-        a = tuple([tuple(a[0]), tuple(a[1])])
-        
         # Update Q(s,a)
         if s_ is not None:
-            # hold list of Q values for all a_,s_ pairs. We will access the max later
-            Q_options = [self.Q[s_][tuple([tuple(action[0]), tuple(action[1])])] for action in possible_actions]
+            # hold Q values for all a_,s_ pairs. We will access the max later
+            Q_options = self.Q.get_values(s_, possible_actions)
             # update
-            self.Q[s][a] += self.alpha*(r + self.gamma*max(Q_options) - self.Q[s][a])
+            self.Q.add(s, a, self.alpha*(r + self.gamma*np.max(Q_options) - self.Q.get(s, a)))
 
         else:
             # terminal state update
-            self.Q[s][a] += self.alpha*(r - self.Q[s][a])
+            self.Q.add(s, a, self.alpha*(r - self.Q.get(s, a)))
 
         # add r to rewards list
         self.rewards.append(r)
@@ -163,8 +211,8 @@ class SARSAlearner(Learner):
     """
     A class to implement the SARSA agent.
     """
-    def __init__(self, alpha, gamma, eps, eps_decay=0.):
-        super().__init__(alpha, gamma, eps, eps_decay)
+    def __init__(self, alpha, gamma, eps, eps_decay=0., sparse=False):
+        super().__init__(alpha, gamma, eps, eps_decay, sparse)
     
 
     def update(self, s, s_, a, a_, r, possible_actions):
@@ -177,24 +225,21 @@ class SARSAlearner(Learner):
             previous state
         s_ : int
             new state
-        a : (i,j) tuple
-            previous action
-        a_ : (i,j) tuple
+        a : int
+            previous action (a move code)
+        a_ : int
             new action
         r : int
             reward received after executing action "a" in state "s"
         possible_actions : list
             list of possible actions from state "s". NOT USED WITH ON-POLICY AGENT
         """
-        a = tuple([tuple(a[0]), tuple(a[1])])
-
         # Update Q(s,a)
         if s_ is not None:
-            a_ = tuple([tuple(a_[0]), tuple(a_[1])])
-            self.Q[s][a] += self.alpha*(r + self.gamma*self.Q[s_][a_] - self.Q[s][a])
+            self.Q.add(s, a, self.alpha*(r + self.gamma*self.Q.get(s_, a_) - self.Q.get(s, a)))
         else:
             # terminal state update
-            self.Q[s][a] += self.alpha*(r - self.Q[s][a])
+            self.Q.add(s, a, self.alpha*(r - self.Q.get(s, a)))
 
         # add r to rewards list
         self.rewards.append(r)
@@ -207,8 +252,8 @@ class MCOffPolicyLearner(Learner):
     """
     A class to implement the Monte Carlo Off Policy agent.
     """    
-    def __init__(self, alpha, gamma, eps, eps_decay=0.):
-        super().__init__(alpha, gamma, eps, eps_decay)
+    def __init__(self, alpha, gamma, eps, eps_decay=0., sparse=False):
+        super().__init__(alpha, gamma, eps, eps_decay, sparse)
 
     def update(self, s, s_, a, a_, r, possible_actions):
         """
@@ -220,22 +265,21 @@ class MCOffPolicyLearner(Learner):
             previous state
         s_ : int
             new state. NOT USED
-        a : (i,j) tuple
-            previous action
-        a_ : (i,j) tuple
+        a : int
+            previous action (a move code)
+        a_ : int
             new action.
         r : int
             reward received after executing action "a" in state "s"
         possible_actions : list
             list of possible actions from state "s".
         """
-        a = tuple([tuple(a[0]), tuple(a[1])])
         self.reward_cache.append(r)
         self.rewards.append(r)
         self.trajectory.append([s,a])
         if s_ is not None:
             # hold list of Q values for all a_,s_ pairs. We will access the max later
-            Q_options = [self.Q[s_][tuple([tuple(action[0]), tuple(action[1])])] for action in possible_actions]
+            Q_options = self.Q.get_values(s_, possible_actions).tolist()
             # update target trajectory
             max_Q = max(Q_options)
             traj = []
@@ -255,18 +299,14 @@ class MCOffPolicyLearner(Learner):
             t = len(self.trajectory) - 1
             # update Q table for full trajectory
             for state, action in self.trajectory [::-1]:
-                action = tuple([tuple(action[0]), tuple(action[1])])
                 reward = self.reward_cache[t]
                 cum_reward = self.compute_cum_rewards(self.gamma, t, self.reward_cache) + reward
-                try:
-                    self.C[state][action] += self.alpha
-                except KeyError:
-                    if self.C.get(state) is None:
-                        self.C[state] = {}
-                    self.C[state][action] = self.alpha
-                self.Q[state][action] += (cum_reward - self.Q[state][action]) * (self.alpha/self.C[state][action])
+                i = self.Q.get_entry(state, action)
+                values, C = self.Q.values, self.Q.get_counts()
+                C[i] += self.alpha
+                values[i] += (cum_reward - values[i]) * (self.alpha/C[i])
                 
-                if list([list(action[0]),list(action[1])]) not in self.target_trajectory[t]:
+                if action not in self.target_trajectory[t]:
                     break
                 t -= 1
 
@@ -278,8 +318,8 @@ class MCOnPolicyLearner(Learner):
     """
     A class to implement the Monte Carlo On Policy agent.
     """    
-    def __init__(self, alpha, gamma, eps, eps_decay=0.):
-        super().__init__(alpha, gamma, eps, eps_decay)
+    def __init__(self, alpha, gamma, eps, eps_decay=0., sparse=False):
+        super().__init__(alpha, gamma, eps, eps_decay, sparse)
 
     def update(self, s, s_, a, a_, r, possible_actions):
         """
@@ -291,16 +331,15 @@ class MCOnPolicyLearner(Learner):
             previous state
         s_ : int
             new state. NOT USED
-        a : (i,j) tuple
-            previous action
-        a_ : (i,j) tuple
+        a : int
+            previous action (a move code)
+        a_ : int
             new action. NOT USED
         r : int
             reward received after executing action "a" in state "s"
         possible_actions : list
             list of possible actions from state "s". NOT USED WITH ON-POLICY AGENT
         """
-        a = tuple([tuple(a[0]), tuple(a[1])])
         self.reward_cache.append(r)
         self.rewards.append(r)
         self.trajectory.append([s,a])
@@ -318,14 +357,150 @@ class MCOnPolicyLearner(Learner):
         t = 0
         # update Q table for full trajectory
         for state, action in self.trajectory:
-            action = tuple([tuple(action[0]), tuple(action[1])])
             reward = self.reward_cache[t]
             cum_reward = self.compute_cum_rewards(self.gamma, t, self.reward_cache) + reward
-            try:
-                self.Q[state][action] += self.alpha * (cum_reward - self.Q[state][action])
-            except KeyError:
-                self.Q[state][action] = self.alpha * (cum_reward - self.Q[state][action])
+            self.Q.add(state, action, self.alpha * (cum_reward - self.Q.get(state, action)))
             t += 1
 
         # update epsilon; geometric decay
-        self.eps *= (1.-self.eps_decay)
\ No newline at end of file
+        self.eps *= (1.-self.eps_decay)
+
+
+class LinearQlearner(Learner):
+    """
+    A class to implement a Q-learning agent which approximates Q-values with a linear
+    function of board features (see features.py) instead of a table, so its memory stays
+    the same however many games it plays. The value of a move is the weights times the
+    features of the board the move leaves.
+    """
+    def __init__(self, alpha, gamma, eps, eps_decay=0.):
+        super().__init__(alpha, gamma, eps, eps_decay)
+        self.Q = None
+        self.weights = np.zeros(NUM_FEATURES)
+        # Features of the action chosen by the last and the one before that call to
+        # get_action, and the values of every action in the last one
+        self.features = None
+        self.prev_features = None
+        self.next_values = None
+        self.next_index = None
+
+    def ep_init(self):
+        super().ep_init()
+        self.features = None
+        self.prev_features = None
+
+    def get_values(self, possible_actions):
+        """
+        Gets the feature matrix of the possible actions on the agent's board, one row per
+        action, and the values of the actions.
+        """
+        features = get_features(self.board, possible_actions)
+        return features, features @ self.weights
+
+    def get_action(self, s, possible_actions):
+        """
+        Select an action given the current game state, which is read from the agent's
+        board (see set_board).
+
+        Parameters
+        ----------
+        s : int
+            state. NOT USED
+        possible_actions : list
+            move codes (see moves.py) of the legal moves in state "s"
+        """
+        features, values = self.get_values(possible_actions)
+        # Find location of max
+        ix_max = np.where(values == np.max(values))[0]
+        if random.random() < self.eps:
+            # Random choose.
+            ix_select = random.randint(0,len(possible_actions)-1)
+        elif len(ix_max) > 1:
+            # If multiple actions were max, then sample from them
+            ix_select = np.random.choice(ix_max, 1)[0]
+        else:
+            # If unique max action, select that one
+            ix_select = ix_max[0]
+        self.prev_features = self.features
+        self.features = features[ix_select]
+        self.next_values = values
+        self.next_index = ix_select
+        return possible_actions[ix_select]
+
+    def rank_actions(self, s, possible_actions):
+        """
+        Gets the possible actions on the agent's board sorted from the highest value to
+        the lowest, without changing the weights.
+        """
+        values = self.get_values(possible_actions)[1]
+        return [possible_actions[i] for i in np.argsort(-values, kind='stable')]
+
+    def get_next_value(self):
+        """
+        Gets the value of the new state used in the update target: the best value of
+        its actions for Q-learning.
+        """
+        return np.max(self.next_values)
+
+    def update(self, s, s_, a, a_, r, possible_actions):
+        """
+        Perform the update of the weights, a normalised gradient step which moves
+        the value of the previous action a fraction alpha of the way to its target.
+
+        Parameters
+        ----------
+        s : int
+            previous state
+        s_ : int
+            new state
+        a : int
+            previous action (a move code)
+        a_ : int
+            new action. NOT used by Q-learner!
+        r : int
+            reward received after executing action "a" in state "s"
+        possible_actions : list
+            list of possible actions from state "s_". Their values were found when
+            the new action was chosen
+        """
+        if s_ is not None:
+            # get_action has already been called for the new state
+            features = self.prev_features
+            target = r + self.gamma*self.get_next_value()
+        else:
+            # terminal state update
+            features = self.features
+            target = r
+        error = target - features @ self.weights
+        self.weights += self.alpha * error / (features @ features) * features
+
+        # add r to rewards list
+        self.rewards.append(r)
+
+    def end_update(self):
+        # update epsilon; geometric decay
+        self.eps *= (1.-self.eps_decay)
+
+    def get_memory_usage(self):
+        """
+        Gets the number of weights and the bytes they take, which never changes.
+        """
+        return {'weights': len(self.weights), 'total_bytes': self.weights.nbytes}
+
+    def compact(self):
+        """
+        There is no table to compact.
+        """
+        return 0
+
+
+class LinearSARSAlearner(LinearQlearner):
+    """
+    A class to implement a SARSA agent which approximates Q-values with a linear
+    function of board features (see LinearQlearner).
+    """
+    def get_next_value(self):
+        """
+        Gets the value of the new action, the one the agent will take, for SARSA.
+        """
+        return self.next_values[self.next_index]
@@ -0,0 +1,257 @@
+"""
+NOTES:
+-Holds many games of checkers in NumPy arrays and steps them all at once, for training
+against a random teacher without one Game object per episode
+-self.spots has one row per game of 33 tokens: the 32 playable squares in the same order
+as the rest of checkerstools (square = row * 4 + col) and a last column which is always
+OFF_BOARD, so steps that leave the board can be looked up like any other square
+-As in Game the agent is always player 2 and the teacher is player 1
+-An action is square * 4 + direction (see bitboard.py for the direction numbers) and
+covers one step or one jump. When a jump can be followed by another jump with the same
+piece, the same side moves again and only that piece's jumps are legal, so a multiple
+jump takes one action per jump. Because of this the random teacher picks uniformly from
+the legal jumps at each step, not from the full multiple jumps
+-Finished games are started again straight away, so states returned by step are always
+from a game in progress
+-Games end as in Game.play_game. A game in which DRAW_MOVES turns have passed without
+material changing hands is drawn once the agent has made its next move, as Game finds
+with get_outcome, and the teacher does not reply. Game also checks for repeated
+positions, but its check only ends a game if the same position starts two turns in a
+row, which cannot happen, so there is no repetition rule here
+"""
+
+
+import numpy as np
+
+from checkerstools.bitboard import STEP, JUMP, HEIGHT, WIDTH, NUM_SQUARES, PIECE_DIRECTIONS
+from checkerstools.zobrist import PIECE_KEYS
+
+EMPTY_SPOT = 0
+P1 = 1
+P2 = 2
+P1_K = 3
+P2_K = 4
+OFF_BOARD = -1
+NUM_ACTIONS = NUM_SQUARES * 4
+
+START_SPOTS = np.array([P1] * 12 + [EMPTY_SPOT] * 8 + [P2] * 12 + [OFF_BOARD], dtype=np.int8)
+# Steps and jumps which leave the board point at the OFF_BOARD column
+STEP_ARRAY = np.array([[STEP[d][s] if STEP[d][s] != -1 else NUM_SQUARES for d in range(4)] for s in range(NUM_SQUARES)])
+JUMP_ARRAY = np.array([[JUMP[d][s] if JUMP[d][s] != -1 else NUM_SQUARES for d in range(4)] for s in range(NUM_SQUARES)])
+# Whether each token can move in each direction
+DIRECTION_ARRAY = np.array([[d in directions for d in range(4)] for directions in PIECE_DIRECTIONS])
+# Player 2's material minus player 1's for each token, with kings worth two pieces
+MATERIAL_ARRAY = np.array([0, -1, 1, -2, 2])
+PIECE_KEY_ARRAY = np.array(PIECE_KEYS, dtype=np.uint64)
+
+
+class BatchGame:
+    """
+    A batch of checkers games between an agent (player 2) and a teacher (player 1)
+    that picks random moves, stepped together with one action per game.
+    """
+    WIN_REWARD = 100
+    LOSS_REWARD = -100
+    DRAW_MOVES = 50
+
+    def __init__(self, num_games, seed=None):
+        """
+        Initializes num_games games.  The teacher moves first in a random half of them,
+        as in Game.start.
+        """
+        self.num_games = num_games
+        self.rng = np.random.default_rng(seed)
+        self.spots = np.tile(START_SPOTS, (num_games, 1))
+        # True if it is player 1's (the teacher's) turn
+        self.player_turn = np.zeros(num_games, dtype=bool)
+        # The square of the piece in the middle of a multiple jump, or -1
+        self.jumping_square = np.full(num_games, -1)
+        self.draw_counter = np.zeros(num_games, dtype=np.int64)
+        self.turn_material = np.zeros(num_games, dtype=np.int64)
+        self.masks = None
+        self.has_jump = None
+        self.num_wins = 0
+        self.num_losses = 0
+        self.num_draws = 0
+        self.total_moves = 0
+
+    def reset(self):
+        """
+        Starts every game again.  Returns the states and legal action masks as step does.
+        """
+        self.restart_games(np.arange(self.num_games))
+        self.masks, self.has_jump = self.get_legal_masks(np.arange(self.num_games))
+        return self.get_states(), self.masks.copy()
+
+    def restart_games(self, games):
+        """
+        Puts the given games back to the start board, and plays the teacher's first move
+        in the ones where the teacher goes first.
+        """
+        self.spots[games] = START_SPOTS
+        self.player_turn[games] = self.rng.random(len(games)) < 0.5
+        self.jumping_square[games] = -1
+        self.draw_counter[games] = 0
+        self.play_teacher(games[self.player_turn[games]])
+        self.turn_material[games] = self.get_material()[games]
+
+    def get_states(self):
+        """
+        Gets a copy of the 32 playable squares of every game, as Game tokens.
+        """
+        return self.spots[:, :NUM_SQUARES].copy()
+
+    def get_state_keys(self):
+        """
+        Gets the Zobrist key of every game, the same key Game.get_state_key gives, so
+        agents can share Q-tables with the Game training loop.
+        """
+        keys = PIECE_KEY_ARRAY[self.spots[:, :NUM_SQUARES], np.arange(NUM_SQUARES)]
+        return np.bitwise_xor.reduce(keys, axis=1).tolist()
+
+    def get_material(self):
+        """
+        Gets player 2's material minus player 1's for every game, counting kings as two pieces.
+        """
+        return MATERIAL_ARRAY[self.spots[:, :NUM_SQUARES]].sum(axis=1)
+
+    def get_legal_masks(self, games):
+        """
+        Gets a (len(games), NUM_ACTIONS) array which is True for the legal actions of the
+        side to move in each of the given games, and whether those actions are jumps.
+        """
+        spots = self.spots[games]
+        pieces = spots[:, :NUM_SQUARES]
+        parity = self.player_turn[games].astype(np.int8)[:, None]
+        # Player 1's tokens are odd and player 2's are even
+        own = (pieces > 0) & (pieces % 2 == parity)
+        directions = own[:, :, None] & DIRECTION_ARRAY[pieces]
+        targets = spots[:, STEP_ARRAY]
+        landings = spots[:, JUMP_ARRAY]
+        jumps = directions & (targets > 0) & (targets % 2 != parity[:, :, None]) & (landings == EMPTY_SPOT)
+
+        jumping_square = self.jumping_square[games]
+        jumping = jumping_square >= 0
+        if jumping.any():
+            jumps[jumping] &= (np.arange(NUM_SQUARES) == jumping_square[jumping][:, None])[:, :, None]
+        has_jump = jumps.any(axis=(1, 2)) | jumping
+
+        masks = np.where(has_jump[:, None, None], jumps, directions & (targets == EMPTY_SPOT))
+        return masks.reshape(len(games), NUM_ACTIONS), has_jump
+
+    def make_moves(self, games, actions, is_jump):
+        """
+        Makes one action in each of the given games.  Games where the moved piece can
+        jump again keep the same player to move, the rest switch turns.
+        """
+        squares = actions // 4
+        directions = actions % 4
+        steps = STEP_ARRAY[squares, directions]
+        ends = np.where(is_jump, JUMP_ARRAY[squares, directions], steps)
+        pieces = self.spots[games, squares]
+
+        self.spots[games, squares] = EMPTY_SPOT
+        self.spots[games[is_jump], steps[is_jump]] = EMPTY_SPOT
+        end_rows = ends // WIDTH
+        promoted = ((pieces == P1) & (end_rows == HEIGHT - 1)) | ((pieces == P2) & (end_rows == 0))
+        # P1 + 2 is P1_K and P2 + 2 is P2_K
+        self.spots[games, ends] = np.where(promoted, pieces + 2, pieces)
+
+        # A jump continues if the piece can jump again, unless a man was just crowned
+        self.jumping_square[games] = np.where(is_jump & ~promoted, ends, -1)
+        continuing = games[is_jump & ~promoted]
+        if len(continuing):
+            can_jump = self.get_legal_masks(continuing)[0].any(axis=1)
+            self.jumping_square[continuing[~can_jump]] = -1
+        switching = games[self.jumping_square[games] == -1]
+        self.player_turn[switching] = ~self.player_turn[switching]
+
+    def play_teacher(self, games):
+        """
+        Plays random teacher moves in the given games until it is the agent's turn in each.
+        Returns the games where the teacher had no legal moves.
+        """
+        stuck = []
+        while len(games):
+            masks, has_jump = self.get_legal_masks(games)
+            can_move = masks.any(axis=1)
+            stuck.append(games[~can_move])
+            games, masks, has_jump = games[can_move], masks[can_move], has_jump[can_move]
+            # The highest random score among the legal actions picks one uniformly
+            scores = self.rng.random(masks.shape)
+            scores[~masks] = -1
+            self.make_moves(games, scores.argmax(axis=1), has_jump)
+            games = games[self.player_turn[games]]
+        return np.concatenate(stuck) if stuck else np.array([], dtype=np.int64)
+
+    def step(self, actions):
+        """
+        Makes the given action (one per game) for the agent, then plays the teacher's reply
+        in every game where the agent's turn is over.
+
+        Returns (states, rewards, dones, masks): the new states as from get_states, the
+        agent's reward in each game, whether each game ended (it has already been started
+        again) and the legal action masks for the new states.  Rewards and the end of
+        the game follow Game.play_game: the change in material, or 100/-100/0 for a
+        win/loss/draw, where a game is drawn by the 50 turn rule after the agent's move
+        (see the notes).
+        """
+        actions = np.asarray(actions)
+        games = np.arange(self.num_games)
+        if self.masks is None:
+            self.masks, self.has_jump = self.get_legal_masks(games)
+        if not self.masks[games, actions].all():
+            raise ValueError("BatchGame.step was given an illegal action")
+        start_material = self.get_material()
+        self.make_moves(games, actions, self.has_jump)
+        self.total_moves += self.num_games
+        dones = np.zeros(self.num_games, dtype=bool)
+
+        # Games still on the agent's turn are in the middle of a multiple jump
+        teacher_games = games[self.player_turn]
+        # As Game.get_outcome, once the agent has moved a game with DRAW_MOVES turns
+        # without a capture is drawn, unless the agent has just taken the last piece
+        teacher_left = (self.spots[teacher_games, :NUM_SQUARES] % 2 == 1).any(axis=1)
+        drawn = teacher_games[(self.draw_counter[teacher_games] >= self.DRAW_MOVES) & teacher_left]
+        dones[drawn] = True
+        self.num_draws += len(drawn)
+        teacher_games = teacher_games[~dones[teacher_games]]
+        no_teacher_moves = self.play_teacher(teacher_games)
+
+        material = self.get_material()
+        rewards = (material - start_material).astype(np.float64)
+        rewards[drawn] = 0
+        rewards[no_teacher_moves] = self.WIN_REWARD
+        dones[no_teacher_moves] = True
+        self.num_wins += len(no_teacher_moves)
+
+        masks, has_jump = self.get_legal_masks(games)
+        lost = ~dones & ~masks.any(axis=1)
+        rewards[lost] = self.LOSS_REWARD
+        dones[lost] = True
+        self.num_losses += int(lost.sum())
+
+        # As in Game.play_game, count turns in which no material changed hands
+        finished_turns = np.zeros(self.num_games, dtype=bool)
+        finished_turns[teacher_games] = True
+        finished_turns &= ~dones
+        unchanged = material == self.turn_material
+        self.draw_counter[finished_turns & unchanged] += 1
+        self.draw_counter[finished_turns & ~unchanged] = 0
+        self.turn_material[finished_turns] = material[finished_turns]
+
+        if dones.any():
+            self.restart_games(games[dones])
+            masks[dones], has_jump[dones] = self.get_legal_masks(games[dones])
+        self.masks, self.has_jump = masks, has_jump
+        return self.get_states(), rewards, dones, masks.copy()
+
+    def sample_actions(self, masks=None):
+        """
+        Picks a random legal action for every game, e.g. for an exploring agent.
+        """
+        if masks is None:
+            masks = self.masks
+        scores = self.rng.random(masks.shape)
+        scores[~masks] = -1
+        return scores.argmax(axis=1)
@@ -0,0 +1,341 @@
+"""
+NOTES:
+-The 32 playable squares are numbered row by row, square = row * 4 + col, which is
+the same order Game.spots is read in (and the order get_state_key writes digits in)
+-Bit n of a mask is set if square n holds a piece of that type
+-Directions are numbered in the order the list engine tries them:
+ 0: forward right, 1: forward left, 2: backward right, 3: backward left
+ where forward is towards row 7 (the way player 1's men move)
+-Moves are generated in exactly the same order as Game.get_possible_next_moves so
+that trained agents see the same action lists from either backend
+-Moves are returned as the int move codes described in moves.py
+"""
+
+
+from checkerstools.moves import LENGTH_BITS, SQUARE_BITS, decode_squares
+
+
+HEIGHT = 8
+WIDTH = 4
+NUM_SQUARES = HEIGHT * WIDTH
+FULL_BOARD = (1 << NUM_SQUARES) - 1
+
+FORWARD_RIGHT = 0
+FORWARD_LEFT = 1
+BACKWARD_RIGHT = 2
+BACKWARD_LEFT = 3
+
+P1_MAN_DIRECTIONS = (FORWARD_RIGHT, FORWARD_LEFT)
+P2_MAN_DIRECTIONS = (BACKWARD_RIGHT, BACKWARD_LEFT)
+KING_DIRECTIONS = (FORWARD_RIGHT, FORWARD_LEFT, BACKWARD_RIGHT, BACKWARD_LEFT)
+OPPOSITE = (BACKWARD_LEFT, BACKWARD_RIGHT, FORWARD_LEFT, FORWARD_RIGHT)
+
+ROW_MASKS = [0xF << (WIDTH * row) for row in range(HEIGHT)]
+P1_KING_ROW = ROW_MASKS[HEIGHT - 1]
+P2_KING_ROW = ROW_MASKS[0]
+
+
+def _make_step_table():
+    """
+    Builds the one step neighbour of every square in every direction, or -1 when the
+    step leaves the board. Even rows sit one half square to the right of odd rows.
+    """
+    table = [[-1] * NUM_SQUARES for _ in range(4)]
+    for square in range(NUM_SQUARES):
+        row, col = divmod(square, WIDTH)
+        if row % 2 == 0:
+            right_col, left_col = col, col - 1
+        else:
+            right_col, left_col = col + 1, col
+        for direction, row_change, new_col in [(FORWARD_RIGHT, 1, right_col), (FORWARD_LEFT, 1, left_col),
+                                               (BACKWARD_RIGHT, -1, right_col), (BACKWARD_LEFT, -1, left_col)]:
+            new_row = row + row_change
+            if 0 <= new_row < HEIGHT and 0 <= new_col < WIDTH:
+                table[direction][square] = new_row * WIDTH + new_col
+    return table
+
+
+STEP = _make_step_table()
+# The square jumped over is the one step neighbour, the landing square is one more step the same way
+JUMP = [[STEP[d][STEP[d][s]] if STEP[d][s] != -1 else -1 for s in range(NUM_SQUARES)] for d in range(4)]
+JUMPED_SQUARE = {(s, JUMP[d][s]): STEP[d][s] for d in range(4) for s in range(NUM_SQUARES) if JUMP[d][s] != -1}
+LOCATIONS = [(square // WIDTH, square % WIDTH) for square in range(NUM_SQUARES)]
+# The move code of the simple move from each square in each direction
+STEP_CODES = [[(s << LENGTH_BITS) | (STEP[d][s] << (LENGTH_BITS + SQUARE_BITS)) if STEP[d][s] != -1 else -1
+               for s in range(NUM_SQUARES)] for d in range(4)]
+
+
+def _make_neighbour_table():
+    """
+    Builds the [row, col] lookup used by the list based move generators, where
+    NEIGHBOUR_TABLE[row][col][direction] is (step, jumped, landing). step is the one
+    step target, jumped the square a jump passes over (the same square) and landing the
+    square a jump lands on, each a [row, col] list or None when it is off the board.
+    The lists are shared by every caller and must not be modified.
+    """
+    location_lists = [[row, col] for row, col in LOCATIONS]
+    table = [[None] * WIDTH for _ in range(HEIGHT)]
+    for square in range(NUM_SQUARES):
+        entries = []
+        for direction in range(4):
+            step = location_lists[STEP[direction][square]] if STEP[direction][square] != -1 else None
+            landing = location_lists[JUMP[direction][square]] if JUMP[direction][square] != -1 else None
+            entries.append((step, step, landing))
+        table[square // WIDTH][square % WIDTH] = tuple(entries)
+    return table
+
+
+NEIGHBOUR_TABLE = _make_neighbour_table()
+# The directions each Game token moves in, indexed by the token (0 is an empty spot)
+PIECE_DIRECTIONS = ((), P1_MAN_DIRECTIONS, P2_MAN_DIRECTIONS, KING_DIRECTIONS, KING_DIRECTIONS)
+
+
+def _make_shift_table():
+    """
+    Builds, for every direction, the (source mask, shift) pairs used to move a whole
+    mask one step at once. Each pair covers the squares of one row parity that have a
+    neighbour in that direction, so the shifted bits never wrap around an edge.
+    """
+    table = []
+    for direction in range(4):
+        pairs = {}
+        for square in range(NUM_SQUARES):
+            target = STEP[direction][square]
+            if target != -1:
+                shift = target - square
+                pairs[shift] = pairs.get(shift, 0) | (1 << square)
+        table.append([(mask, shift) for shift, mask in pairs.items()])
+    return table
+
+
+SHIFTS = _make_shift_table()
+
+
+def shift_mask(mask, direction):
+    """
+    Moves every bit in the given mask one step in the given direction, dropping the
+    bits which would step off the board.
+    """
+    answer = 0
+    for source_mask, shift in SHIFTS[direction]:
+        if shift > 0:
+            answer |= (mask & source_mask) << shift
+        else:
+            answer |= (mask & source_mask) >> -shift
+    return answer
+
+
+def iter_squares(mask):
+    """
+    Yields the squares of every set bit in the given mask from lowest to highest.
+    """
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
+
+def reverse_mask(mask):
+    """
+    Gets the mask with square s moved to square 31 - s, i.e. the board turned half a turn.
+    """
+    return int(f'{mask:032b}'[::-1], 2)
+
+
+def flip_state(p1, p2, kings):
+    """
+    Gets the (p1, p2, kings) masks of the board turned half a turn with the colours
+    swapped, which plays the same for the other side to move (see zobrist.py).
+    """
+    return reverse_mask(p2), reverse_mask(p1), reverse_mask(kings)
+
+
+class BitBoard:
+    """
+    A checkers board stored as three integer bitmasks over the 32 playable squares:
+    the pieces of player 1, the pieces of player 2 and the kings of either player.
+    The side to move's mask is used as its own pieces and the other as the opponent's.
+    """
+    EMPTY_SPOT = 0
+    P1 = 1
+    P2 = 2
+    P1_K = 3
+    P2_K = 4
+
+    def __init__(self, p1=0, p2=0, kings=0):
+        self.p1 = p1
+        self.p2 = p2
+        self.kings = kings
+
+    @classmethod
+    def from_spots(cls, spots):
+        """
+        Creates a BitBoard from a Game style list of 8 rows of 4 spots.
+        """
+        board = cls()
+        board.set_spots(spots)
+        return board
+
+    def set_spots(self, spots):
+        """
+        Replaces the masks with the pieces found in the given spots.
+        """
+        p1 = p2 = kings = 0
+        bit = 1
+        for row in spots:
+            for element in row:
+                if element == self.P1:
+                    p1 |= bit
+                elif element == self.P2:
+                    p2 |= bit
+                elif element == self.P1_K:
+                    p1 |= bit
+                    kings |= bit
+                elif element == self.P2_K:
+                    p2 |= bit
+                    kings |= bit
+                bit <<= 1
+        self.p1, self.p2, self.kings = p1, p2, kings
+
+    def get_spots(self):
+        """
+        Gets the Game style spots for the current masks.
+        """
+        spots = [[self.EMPTY_SPOT] * WIDTH for _ in range(HEIGHT)]
+        for square in range(NUM_SQUARES):
+            spots[square // WIDTH][square % WIDTH] = self.get_piece(square)
+        return spots
+
+    def get_piece(self, square):
+        """
+        Gets the Game token of the piece on the given square.
+        """
+        bit = 1 << square
+        if self.p1 & bit:
+            return self.P1_K if self.kings & bit else self.P1
+        if self.p2 & bit:
+            return self.P2_K if self.kings & bit else self.P2
+        return self.EMPTY_SPOT
+
+    def get_state(self):
+        """
+        Gets the masks as a tuple so they can be restored later with set_state.
+        """
+        return self.p1, self.p2, self.kings
+
+    def set_state(self, state):
+        self.p1, self.p2, self.kings = state
+
+    def get_simple_moves(self, player_turn):
+        """
+        Gets every move for the side to move which does not capture a piece.
+        """
+        own = self.p1 if player_turn else self.p2
+        empty = FULL_BOARD & ~(self.p1 | self.p2)
+        own_kings = own & self.kings
+        man_directions = P1_MAN_DIRECTIONS if player_turn else P2_MAN_DIRECTIONS
+
+        # Find, for each direction at once, which pieces have an empty square next to them
+        movers = [0, 0, 0, 0]
+        for direction in range(4):
+            pieces = own if direction in man_directions else own_kings
+            if pieces:
+                movers[direction] = shift_mask(empty, OPPOSITE[direction]) & pieces
+
+        answer = []
+        for square in iter_squares(movers[0] | movers[1] | movers[2] | movers[3]):
+            bit = 1 << square
+            for direction in (KING_DIRECTIONS if own_kings & bit else man_directions):
+                if movers[direction] & bit:
+                    answer.append(STEP_CODES[direction][square])
+        return answer
+
+    def get_capture_moves(self, player_turn):
+        """
+        Gets every move for the side to move which captures at least one piece, following
+        each jump until the piece can not jump again or a man reaches the king row.
+        """
+        own = self.p1 if player_turn else self.p2
+        opponent = self.p2 if player_turn else self.p1
+        empty = FULL_BOARD & ~(self.p1 | self.p2)
+        own_kings = own & self.kings
+        man_directions = P1_MAN_DIRECTIONS if player_turn else P2_MAN_DIRECTIONS
+        king_row = P1_KING_ROW if player_turn else P2_KING_ROW
+
+        # Find the pieces with at least one jump available before following any of them
+        jumpers = 0
+        for direction in range(4):
+            pieces = own if direction in man_directions else own_kings
+            if pieces:
+                targets = shift_mask(shift_mask(pieces, direction) & opponent, direction) & empty
+                jumpers |= shift_mask(shift_mask(targets, OPPOSITE[direction]), OPPOSITE[direction])
+        jumpers &= own
+
+        answer = []
+        for square in iter_squares(jumpers):
+            bit = 1 << square
+            is_king = own_kings & bit
+            directions = KING_DIRECTIONS if is_king else man_directions
+            stop_row = 0 if is_king else king_row
+            # The start square is empty once the piece has left it
+            self._add_jumps(square, directions, stop_row, opponent, empty | bit, square << LENGTH_BITS, 1, answer)
+        return answer
+
+    def _add_jumps(self, square, directions, stop_row, opponent, empty, path_bits, path_length, answer):
+        """
+        Recursively adds the jump sequences continuing from the given square to answer.
+        path_bits holds the squares visited so far, packed as in a move code, and
+        path_length is how many squares that is.
+        """
+        for direction in directions:
+            landing = JUMP[direction][square]
+            if landing == -1:
+                continue
+            jumped_bit = 1 << STEP[direction][square]
+            landing_bit = 1 << landing
+            if opponent & jumped_bit and empty & landing_bit:
+                new_path_bits = path_bits | (landing << (LENGTH_BITS + SQUARE_BITS * path_length))
+                answer_length = len(answer)
+                if not stop_row & landing_bit:
+                    self._add_jumps(landing, directions, stop_row, opponent ^ jumped_bit,
+                                    (empty | jumped_bit) & ~landing_bit, new_path_bits, path_length + 1, answer)
+                if len(answer) == answer_length:
+                    answer.append(new_path_bits | (path_length - 1))
+
+    def get_possible_next_moves(self, player_turn):
+        """
+        Gets the possible moves that can be made by the side to move. Captures are
+        forced, so simple moves are only returned if there are no captures.
+        """
+        capture_moves = self.get_capture_moves(player_turn)
+        if capture_moves:
+            return capture_moves
+        return self.get_simple_moves(player_turn)
+
+    def make_move(self, move):
+        """
+        Makes a move given as a move code, removing any jumped pieces and crowning a man
+        that finishes on its king row.
+        """
+        squares = decode_squares(move)
+        start_bit = 1 << squares[0]
+        end_bit = 1 << squares[-1]
+        player_one = self.p1 & start_bit
+        is_king = self.kings & start_bit
+
+        if abs(squares[0] // WIDTH - squares[1] // WIDTH) == 2:
+            captured = 0
+            for j in range(len(squares) - 1):
+                captured |= 1 << JUMPED_SQUARE[(squares[j], squares[j + 1])]
+            self.p1 &= ~captured
+            self.p2 &= ~captured
+            self.kings &= ~captured
+
+        if player_one:
+            self.p1 = (self.p1 & ~start_bit) | end_bit
+        else:
+            self.p2 = (self.p2 & ~start_bit) | end_bit
+        self.kings &= ~start_bit
+        if is_king or end_bit & (P1_KING_ROW if player_one else P2_KING_ROW):
+            self.kings |= end_bit
+
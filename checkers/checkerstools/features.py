@@ -0,0 +1,67 @@
+"""
+NOTES:
+-Board features for the linear function approximation learners (see LinearQlearner in
+agent.py). A move is scored by the features of the board it leaves, its afterstate, so
+every legal move of a state is one row of a feature matrix and all of them are scored
+with one matrix product
+-Features are from player 2's point of view, the side the agent plays: own pieces are
+player 2's and opposing pieces are player 1's
+-The features, in order:
+ bias (always 1)
+ material: own men, own kings, opposing men, opposing kings, each over 12
+ advancement: the rows own men and opposing men have moved forward, over 12 * 6
+ mobility: the number of moves player 1 then has, and player 2 would have, over 12
+ occupancy: 0 or 1 for each of own men, own kings, opposing men and opposing kings on
+ each of the 32 squares
+-The number of features is fixed, so the learner's weights take the same memory however
+many positions it has seen
+"""
+
+
+import numpy as np
+
+from checkerstools.bitboard import BitBoard, NUM_SQUARES, WIDTH
+
+NUM_PIECES = 12
+NUM_FEATURES = 1 + 4 + 2 + 2 + 4 * NUM_SQUARES
+SQUARES = np.arange(NUM_SQUARES, dtype=np.int64)
+# How far forward a man on each square has moved: player 1's men start on rows 0-2 and
+# move up, player 2's start on rows 5-7 and move down
+P1_ADVANCE = np.maximum(SQUARES // WIDTH - 2, 0)
+P2_ADVANCE = np.maximum(5 - SQUARES // WIDTH, 0)
+
+
+def get_afterstates(board, moves):
+    """
+    Gets the (p1, p2, kings) masks of the board after each of the given moves, and the
+    number of moves each side has there, as an array with one row per move.
+    """
+    if board.bitboard is not None:
+        start = board.bitboard.get_state()
+    else:
+        start = BitBoard.from_spots(board.spots).get_state()
+    bitboard = BitBoard()
+    rows = []
+    for move in moves:
+        bitboard.set_state(start)
+        bitboard.make_move(move)
+        rows.append(bitboard.get_state() + (len(bitboard.get_possible_next_moves(True)),
+                                            len(bitboard.get_possible_next_moves(False))))
+    return np.array(rows, dtype=np.int64).reshape(len(moves), 5)
+
+
+def get_features(board, moves):
+    """
+    Gets the feature matrix of the given moves on the board, one row per move.
+    """
+    afterstates = get_afterstates(board, moves)
+    bits = (afterstates[:, :3, None] >> SQUARES) & 1
+    p1, p2, kings = bits[:, 0], bits[:, 1], bits[:, 2]
+    own_men, own_kings = p2 & (1 - kings), p2 & kings
+    opposing_men, opposing_kings = p1 & (1 - kings), p1 & kings
+    occupancy = np.concatenate([own_men, own_kings, opposing_men, opposing_kings], axis=1)
+    material = np.stack([own_men.sum(1), own_kings.sum(1), opposing_men.sum(1), opposing_kings.sum(1)], axis=1) / NUM_PIECES
+    advancement = np.stack([own_men @ P2_ADVANCE, opposing_men @ P1_ADVANCE], axis=1) / (NUM_PIECES * 6)
+    mobility = afterstates[:, 3:] / NUM_PIECES
+    bias = np.ones((len(moves), 1))
+    return np.concatenate([bias, material, advancement, mobility, occupancy], axis=1)
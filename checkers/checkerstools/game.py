@@ -10,8 +10,10 @@ which is showing the piece at [y1,x1] goes to [y2,x2] then [y3,x3] as one move
 
 import math
 import random
-import copy
 from functools import reduce 
+from checkerstools.bitboard import BitBoard, NEIGHBOUR_TABLE, PIECE_DIRECTIONS
+from checkerstools.zobrist import PIECE_KEYS, hash_spots
+from checkerstools.moves import encode_move, decode_move
 
 class Game:
     """
@@ -27,12 +29,17 @@ class Game:
     WIDTH = 4
     
     
-    def __init__(self, agent, teacher=None, old_spots=None, player_turn=True):
+    def __init__(self, agent, teacher=None, old_spots=None, player_turn=True, use_bitboard=True):
         """
         Initializes a new instance of the Game class.  Unless specified otherwise, 
-        the board will be created with a start board configuration.
+        the board will be created with a start board configuration.  If use_bitboard
+        is True, moves are generated from a BitBoard kept in step with self.spots,
+        otherwise the list based move generator below is used.
         """
         self.agent = agent
+        if agent is not None:
+            # Learners which score moves by board features read the board from here
+            agent.set_board(self)
         self.teacher = teacher
         self.player_turn = player_turn
         self.draw_counter = 0
@@ -43,12 +50,20 @@ class Game:
             self.spots = [[j, j, j, j] for j in [self.P1, self.P1, self.P1, self.EMPTY_SPOT, self.EMPTY_SPOT, self.P2, self.P2, self.P2]]
         else:
             self.spots = old_spots
-    
+        self.bitboard = BitBoard.from_spots(self.spots) if use_bitboard else None
+        self.zobrist_key = hash_spots(self.spots)
+        self.piece_counter = self.count_pieces_and_kings()
+
+
     def empty_board(self):
         """
         Removes any pieces currently on the board and leaves the board with nothing but empty spots.
         """
         self.spots = [[j, j, j, j] for j in [self.EMPTY_SPOT] * self.HEIGHT]  # Make sure [self.EMPTY_SPOT]*self.HEIGHT] has no issues
+        if self.bitboard is not None:
+            self.bitboard.set_spots(self.spots)
+        self.zobrist_key = 0
+        self.piece_counter = [0, 0, 0, 0]
     
 
     def get_outcome(self):
@@ -59,14 +74,15 @@ class Game:
         2: Player 2 wins
         3: Game is a tie
         """
-        piece_counter = self.get_number_of_pieces_and_kings()
+        piece_counter = self.piece_counter
         if piece_counter[0] != 0 or piece_counter[2] != 0:
             if piece_counter[1] != 0 or piece_counter[3] != 0:
-                if self.draw_counter >= 50:
-                    return 3
-                return 0
-            return 1
-        return 2
+                answer = 3 if self.draw_counter >= 50 else 0
+            else:
+                answer = 1
+        else:
+            answer = 2
+        return answer
 
 
     def is_game_over(self):
@@ -84,8 +100,23 @@ class Game:
         Gets the number of pieces and the number of kings that each player has on the current 
         board configuration represented in the given spots. The format of the function with defaults is:
         [P1_pieces, P2_pieces, P1_kings, P2_kings]
-        and if given a player_id:
-        [player_pieces, player_kings]
+        The counts are kept up to date by make_move, so this is a copy of self.piece_counter.
+        """
+        return self.piece_counter[:]
+
+
+    def get_material(self):
+        """
+        Gets player 2's material minus player 1's, counting kings as two pieces.
+        """
+        piece_counter = self.piece_counter
+        return (piece_counter[1] + 2 * piece_counter[3]) - (piece_counter[0] + 2 * piece_counter[2])
+
+
+    def count_pieces_and_kings(self):
+        """
+        Counts the pieces and kings on the board from scratch, in the same format as
+        get_number_of_pieces_and_kings.
         """
         piece_counter = [0,0,0,0]  
         for row in self.spots:
@@ -154,23 +185,16 @@ class Game:
         PRE-CONDITION:
         -start_loc is a location with a players piece
         """
-        if self.spots[start_loc[0]][start_loc[1]] > 2:
-            next_locations = self.forward_n_locations(start_loc, 1)
-            next_locations.extend(self.forward_n_locations(start_loc, 1, True))
-        elif self.spots[start_loc[0]][start_loc[1]] == self.BACKWARDS_PLAYER:
-            next_locations = self.forward_n_locations(start_loc, 1, True)  # Switched the true from the statement below
-        else:
-            next_locations = self.forward_n_locations(start_loc, 1)
-        
-
-        possible_next_locations = []
+        piece = self.spots[start_loc[0]][start_loc[1]]
+        neighbours = NEIGHBOUR_TABLE[start_loc[0]][start_loc[1]]
 
-        for location in next_locations:
-            if len(location) != 0:
-                if self.spots[location[0]][location[1]] == self.EMPTY_SPOT:
-                    possible_next_locations.append(location)
+        answer = []
+        for direction in PIECE_DIRECTIONS[piece]:
+            step = neighbours[direction][0]
+            if step is not None and self.spots[step[0]][step[1]] == self.EMPTY_SPOT:
+                answer.append([start_loc, step])
             
-        return [[start_loc, end_spot] for end_spot in possible_next_locations]      
+        return answer      
            
      
     def get_capture_moves(self, start_loc, move_beginnings=None):
@@ -181,37 +205,26 @@ class Game:
             move_beginnings = [start_loc]
             
         answer = []
-        if self.spots[start_loc[0]][start_loc[1]] > 2:  
-            next1 = self.forward_n_locations(start_loc, 1)
-            next2 = self.forward_n_locations(start_loc, 2)
-            next1.extend(self.forward_n_locations(start_loc, 1, True))
-            next2.extend(self.forward_n_locations(start_loc, 2, True))
-        elif self.spots[start_loc[0]][start_loc[1]] == self.BACKWARDS_PLAYER:
-            next1 = self.forward_n_locations(start_loc, 1, True)
-            next2 = self.forward_n_locations(start_loc, 2, True)
-        else:
-            next1 = self.forward_n_locations(start_loc, 1)
-            next2 = self.forward_n_locations(start_loc, 2)
-        
-        
-        for j in range(len(next1)):
-            if (not self.not_spot(next2[j])) and (not self.not_spot(next1[j])) :  # if both spots exist
-                if self.get_spot_info(next1[j]) != self.EMPTY_SPOT and self.get_spot_info(next1[j]) % 2 != self.get_spot_info(start_loc) % 2:  # if next spot is opponent
-                    if self.get_spot_info(next2[j]) == self.EMPTY_SPOT:  # if next next spot is empty
-                        temp_move1 = copy.deepcopy(move_beginnings)
-                        temp_move1.append(next2[j])
+        piece = self.spots[start_loc[0]][start_loc[1]]
+        neighbours = NEIGHBOUR_TABLE[start_loc[0]][start_loc[1]]
+
+        for direction in PIECE_DIRECTIONS[piece]:
+            step, jumped, landing = neighbours[direction]
+            if landing is not None:  # if both spots exist
+                jumped_piece = self.spots[jumped[0]][jumped[1]]
+                if jumped_piece != self.EMPTY_SPOT and jumped_piece % 2 != piece % 2:  # if next spot is opponent
+                    if self.spots[landing[0]][landing[1]] == self.EMPTY_SPOT:  # if next next spot is empty
+                        temp_move1 = move_beginnings + [landing]
                         
                         answer_length = len(answer)
                         
-                        if self.get_spot_info(start_loc) != self.P1 or next2[j][0] != self.HEIGHT - 1: 
-                            if self.get_spot_info(start_loc) != self.P2 or next2[j][0] != 0: 
-
-                                temp_move2 = [start_loc, next2[j]]
-                                
-                                temp_board = Game(self.agent, old_spots=copy.deepcopy(self.spots), player_turn=self.player_turn)
-                                temp_board.make_move(temp_move2, False)
+                        if piece != self.P1 or landing[0] != self.HEIGHT - 1: 
+                            if piece != self.P2 or landing[0] != 0: 
 
-                                answer.extend(temp_board.get_capture_moves(temp_move2[1], temp_move1))
+                                # Follow the jump on this board and take it back afterwards
+                                record = self.make_move([start_loc, landing], False)
+                                answer.extend(self.get_capture_moves(landing, temp_move1))
+                                self.unmake_move(record)
                                 
                         if len(answer) == answer_length:
                             answer.append(temp_move1)
@@ -221,8 +234,11 @@ class Game:
         
     def get_possible_next_moves(self):
         """
-        Gets the possible moves that can be made from the current board configuration.
+        Gets the possible moves that can be made from the current board configuration, as
+        move codes (see moves.py).
         """
+        if self.bitboard is not None:
+            return self.bitboard.get_possible_next_moves(self.player_turn)
         piece_locations = []
         for j in range(self.HEIGHT):
             for i in range(self.WIDTH):
@@ -232,15 +248,11 @@ class Game:
             capture_moves = list(reduce(lambda a, b: a + b, list(map(self.get_capture_moves, piece_locations))))  # CHECK IF OUTER LIST IS NECESSARY
 
             if len(capture_moves) != 0:
-                for x in capture_moves:
-                    x = tuple([tuple(x[0]), tuple(x[1])])
-                return capture_moves
+                return [encode_move(x) for x in capture_moves]
 
             
             basic_moves = list(reduce(lambda a, b: a + b, list(map(self.get_simple_moves, piece_locations))))  # CHECK IF OUTER LIST IS NECESSARY
-            for x in basic_moves:
-                x = tuple([tuple(x[0]), tuple(x[1])])
-            return basic_moves
+            return [encode_move(x) for x in basic_moves]
         except TypeError:
             return []
     
@@ -254,12 +266,16 @@ class Game:
             self.teacher.new_board(self, key)
             action = self.teacher.get_next_move()
             self.make_move(action)
+            if self.teacher.pondering and self.agent is not None:
+                # Let the teacher search the agent's likely replies while the agent moves
+                replies = self.agent.rank_actions(self.get_state_key(), self.get_possible_next_moves())
+                self.teacher.start_pondering(self, replies)
         else:
             self.print_board()
             piece = []
             move = []
             possible_moves = self.get_possible_next_moves()
-            valid_pieces = [possible_moves[x][0] for x in range(len(possible_moves))]
+            valid_pieces = [decode_move(possible_moves[x])[0] for x in range(len(possible_moves))]
             while True:
                 piece_i = input("Your move! Please select the piece you want to move "
                              "in the format row,col: ")
@@ -270,10 +286,10 @@ class Game:
                 except ValueError:
                     print("INVALID INPUT! Please use the correct format.")
                     continue
-                if (self.get_spot_info([row, col]) != self.P1 and self.get_spot_info([row, col]) != self.P1_K) or (valid_pieces.count([row, col]) == 0):
+                if (self.get_spot_info([row, col]) != self.P1 and self.get_spot_info([row, col]) != self.P1_K) or (valid_pieces.count((row, col)) == 0):
                     print("INVALID PIECE! Choose again.")
                     continue
-                piece = [row, col]
+                piece = (row, col)
                 break
             
             while True:
@@ -282,11 +298,11 @@ class Game:
                 print('\n')
                 try:
                     row, col = int(move_i[0]) - 1, int(move_i[2]) - 1
-                    move = [row, col]
+                    move = (row, col)
                 except ValueError:
                     print("INVALID INPUT! Please use the correct format.")
                     continue
-                if (row not in range(4) or col not in range(7)) or (possible_moves.count([piece,move]) == 0):
+                if (row not in range(4) or col not in range(7)) or ([decode_move(x) for x in possible_moves].count((piece, move)) == 0):
                     print("INVALID MOVE! Choose again.")
                     continue
                 break
@@ -300,8 +316,16 @@ class Game:
     def make_move(self, move, switch_player_turn=True):
         """
         Makes a given move on the board, and (as long as is wanted) switches the indicator for
-        which players turn it is.
-        """
+        which players turn it is.  The move is a move code (see moves.py) or a list of
+        [row, col] locations.  Returns a record of what the move captured and promoted
+        which can be given to unmake_move to take the move back.
+        """
+        if not isinstance(move, int):
+            move = encode_move(move)
+        code = move
+        move = decode_move(code)
+        captured = []
+        original_key = self.zobrist_key
         if abs(move[0][0] - move[1][0]) == 2:
             for j in range(len(move) - 1):
                 if move[j][0] % 2 == 1:
@@ -315,22 +339,62 @@ class Game:
                     else:
                         middle_y = move[j][1]
                         
-                self.spots[int((move[j][0] + move[j + 1][0]) / 2)][middle_y] = self.EMPTY_SPOT
-                
+                middle_x = (move[j][0] + move[j + 1][0]) // 2
+                captured.append((middle_x, middle_y, self.spots[middle_x][middle_y]))
+                self.piece_counter[self.spots[middle_x][middle_y] - 1] -= 1
+                self.zobrist_key ^= PIECE_KEYS[self.spots[middle_x][middle_y]][middle_x * self.WIDTH + middle_y]
+                self.spots[middle_x][middle_y] = self.EMPTY_SPOT
                 
-        self.spots[move[len(move) - 1][0]][move[len(move) - 1][1]] = self.spots[move[0][0]][move[0][1]]
-        # Promote to king if at the end of the board
-        if move[len(move) - 1][0] == self.HEIGHT - 1 and self.spots[move[len(move) - 1][0]][move[len(move) - 1][1]] == self.P1:
-            self.spots[move[len(move) - 1][0]][move[len(move) - 1][1]] = self.P1_K
-        elif move[len(move) - 1][0] == 0 and self.spots[move[len(move) - 1][0]][move[len(move) - 1][1]] == self.P2:
-            self.spots[move[len(move) - 1][0]][move[len(move) - 1][1]] = self.P2_K
-        else:
-            self.spots[move[len(move) - 1][0]][move[len(move) - 1][1]] = self.spots[move[0][0]][move[0][1]]
-            
+        # Lift the piece first so a king whose jumps end where they started is not lost
+        end = move[len(move) - 1]
+        piece = self.spots[move[0][0]][move[0][1]]
         self.spots[move[0][0]][move[0][1]] = self.EMPTY_SPOT
+        self.spots[end[0]][end[1]] = piece
+        # Promote to king if at the end of the board
+        promoted = False
+        if end[0] == self.HEIGHT - 1 and piece == self.P1:
+            self.spots[end[0]][end[1]] = self.P1_K
+            promoted = True
+        elif end[0] == 0 and piece == self.P2:
+            self.spots[end[0]][end[1]] = self.P2_K
+            promoted = True
+        if promoted:
+            self.piece_counter[piece - 1] -= 1
+            self.piece_counter[self.spots[end[0]][end[1]] - 1] += 1
+        self.zobrist_key ^= PIECE_KEYS[piece][move[0][0] * self.WIDTH + move[0][1]]
+        self.zobrist_key ^= PIECE_KEYS[self.spots[end[0]][end[1]]][end[0] * self.WIDTH + end[1]]
+
+        original_bits = None
+        if self.bitboard is not None:
+            original_bits = self.bitboard.get_state()
+            self.bitboard.make_move(code)
                 
         if switch_player_turn:
             self.player_turn = not self.player_turn
+
+        return (move, piece, captured, promoted, switch_player_turn, original_bits, original_key)
+
+
+    def unmake_move(self, record):
+        """
+        Takes back a move using the record returned by make_move.  Moves must be taken
+        back in the reverse of the order they were made.
+        """
+        move, piece, captured, promoted, switched_player_turn, original_bits, original_key = record
+        if switched_player_turn:
+            self.player_turn = not self.player_turn
+        end = move[len(move) - 1]
+        if promoted:
+            self.piece_counter[piece - 1] += 1
+            self.piece_counter[self.spots[end[0]][end[1]] - 1] -= 1
+        self.spots[end[0]][end[1]] = self.EMPTY_SPOT
+        self.spots[move[0][0]][move[0][1]] = piece
+        for middle_x, middle_y, captured_piece in captured:
+            self.spots[middle_x][middle_y] = captured_piece
+            self.piece_counter[captured_piece - 1] += 1
+        self.zobrist_key = original_key
+        if original_bits is not None:
+            self.bitboard.set_state(original_bits)
        
 
     def get_potential_spots_from_moves(self, moves):
@@ -342,10 +406,9 @@ class Game:
             return self.spots
         answer = []
         for move in moves:
-            original_spots = copy.deepcopy(self.spots)
-            self.make_move(move, switch_player_turn=False)
-            answer.append(self.spots) 
-            self.spots = original_spots 
+            record = self.make_move(move, switch_player_turn=False)
+            answer.append([row[:] for row in self.spots])
+            self.unmake_move(record)
         return answer
         
         
@@ -357,6 +420,10 @@ class Game:
         """
         for piece_info in pieces_info:
             self.spots[piece_info[0]][piece_info[1]] = piece_info[2]
+        if self.bitboard is not None:
+            self.bitboard.set_spots(self.spots)
+        self.zobrist_key = hash_spots(self.spots)
+        self.piece_counter = self.count_pieces_and_kings()
         
     
     def get_symbol(self, location):
@@ -377,7 +444,17 @@ class Game:
     
     def get_state_key(self):
         """
-        Gets a string representation of the current game board.
+        Gets the Zobrist key of the current game board.  It is kept up to date by
+        make_move, so this does not look at the board at all.
+        """
+        return self.zobrist_key
+
+
+    def get_decimal_key(self):
+        """
+        Gets the old style key of the current game board, with one decimal digit per spot.
+        This is what the teacher's Board is built from, and what zobrist.hash_decimal_key
+        converts from.
         """
         answer = 0
         for j in range(self.HEIGHT):
@@ -432,15 +509,12 @@ class Game:
             print(norm_line)            
 
 
-    def calc_reward(self, prev_state):
+    def calc_reward(self, prev_material):
         """
-        Calculate the reward for the current game state for PLAYER 2. 
+        Calculate the reward for the current game state for PLAYER 2. prev_material is the
+        result of get_material for the previous state.
         """
-        prev_state = str(prev_state)
-        prev_state_val = (prev_state.count("2") + 2 * prev_state.count("4")) - (prev_state.count("1") + 2 * prev_state.count("3"))
-        new_state = str(self.get_state_key())
-        new_state_val = (new_state.count("2") + 2 * new_state.count("4")) - (new_state.count("1") + 2 * new_state.count("3"))
-        return new_state_val - prev_state_val
+        return self.get_material() - prev_material
 
 
     def play_game(self, player_first):
@@ -460,6 +534,7 @@ class Game:
             self.player_move()
         self.agent.ep_init()
         prev_state = self.get_state_key()
+        prev_material = self.get_material()
         possible_actions = self.get_possible_next_moves()
         prev_action = self.agent.get_action(prev_state, possible_actions)
 
@@ -488,8 +563,9 @@ class Game:
                 break
             else:
                 # game continues
-                reward = self.calc_reward(prev_state)
+                reward = self.calc_reward(prev_material)
             new_state = self.get_state_key()
+            new_material = self.get_material()
             if reward != 0:
                 self.draw_counter = 0
             else:
@@ -516,6 +592,7 @@ class Game:
                 self.agent.update(prev_state, new_state, prev_action, new_action, reward, new_possible_actions)
                 # reset "previous" values
                 prev_state = new_state
+                prev_material = new_material
                 prev_action = new_action
                 possible_actions = new_possible_actions
             except ValueError:
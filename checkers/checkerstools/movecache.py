@@ -0,0 +1,89 @@
+"""
+NOTES:
+-Keeps the teacher's most recently used search results in memory in front of the move
+store (see movestore.py), or the shared memory table in front of it (see
+sharedcache.py), so boards the teacher sees again are not looked up there
+-Holds at most max_entries results. When it is full, the result used longest ago is
+evicted, which only drops it from memory since every result is also put in the store
+-Saving the store does not empty the cache, so results in use stay in memory across
+checkpoints
+-Counts hits (found in memory), misses (looked up in the store) and evictions
+"""
+
+
+from collections import OrderedDict
+
+DEFAULT_ENTRIES = 100000
+
+
+class MoveCache:
+    """
+    A least recently used cache of (value, move) results keyed by search depth and board
+    key, backed by a MoveStore or SharedMoveCache.
+    """
+
+    def __init__(self, store, max_entries=DEFAULT_ENTRIES):
+        """
+        Makes an empty cache in front of the given store, holding up to max_entries results.
+        """
+        self.store = store
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, depth, board_key):
+        """
+        Gets the (value, move) for the board at the given depth, from memory if it is
+        there and otherwise from the store, or None if neither has it.
+        """
+        key = (depth, board_key)
+        result = self.entries.get(key)
+        if result is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return result
+        self.misses += 1
+        result = self.store.get(depth, board_key)
+        if result is not None:
+            self.add(key, result)
+        return result
+
+    def put(self, depth, board_key, value, move):
+        """
+        Adds a result to the cache and the store.
+        """
+        self.add((depth, board_key), (value, move))
+        self.store.put(depth, board_key, value, move)
+
+    def add(self, key, result):
+        """
+        Adds a result to memory as the most recently used, evicting the least recently
+        used one if the cache is full.
+        """
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Removes every result from memory. The store is not changed.
+        """
+        self.entries.clear()
+
+    def get_stats(self):
+        """
+        Gets the hit, miss and eviction counts, the share of lookups found in memory and
+        the number of results held.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self.entries),
+        }
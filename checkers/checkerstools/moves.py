@@ -0,0 +1,108 @@
+"""
+NOTES:
+-A move is stored as a small int: the low 4 bits hold the number of squares the piece
+visits minus 2, followed by 5 bits for each square visited, starting square first.
+e.g. a simple move from square 9 to square 13 is 0 | 9 << 4 | 13 << 9
+-Squares are numbered row by row, square = row * 4 + col
+-The game, the teacher and the learners all pass moves around as these ints, so Q-tables
+and teacher tables key on them directly
+-decode_move gives the old [[y1,x1],[y2,x2],...] form as a tuple of (row, col) tuples.
+Decoded moves are cached, so a code always decodes to the same tuple object
+-flip_move gives the same move on the board turned half a turn (see zobrist.py). Doing
+it twice gives back the move it started from
+"""
+
+
+WIDTH = 4
+NUM_SQUARES = 32
+LENGTH_BITS = 4
+SQUARE_BITS = 5
+SQUARE_MASK = (1 << SQUARE_BITS) - 1
+LENGTH_MASK = (1 << LENGTH_BITS) - 1
+
+_decoded_squares = {}
+_decoded_moves = {}
+_flipped_moves = {}
+
+
+def encode_squares(squares):
+    """
+    Gets the move code for a piece visiting the given squares in order.
+    """
+    code = len(squares) - 2
+    shift = LENGTH_BITS
+    for square in squares:
+        code |= square << shift
+        shift += SQUARE_BITS
+    return code
+
+
+def encode_move(move):
+    """
+    Gets the move code for a move given as a list of [row, col] locations.
+    """
+    return encode_squares([loc[0] * WIDTH + loc[1] for loc in move])
+
+
+def decode_squares(code):
+    """
+    Gets the squares visited by the given move code, as a tuple.
+    """
+    try:
+        return _decoded_squares[code]
+    except KeyError:
+        squares = tuple((code >> (LENGTH_BITS + SQUARE_BITS * j)) & SQUARE_MASK for j in range((code & LENGTH_MASK) + 2))
+        _decoded_squares[code] = squares
+        return squares
+
+
+def decode_move(code):
+    """
+    Gets the given move code as a tuple of (row, col) locations.
+    """
+    try:
+        return _decoded_moves[code]
+    except KeyError:
+        move = tuple((square // WIDTH, square % WIDTH) for square in decode_squares(code))
+        _decoded_moves[code] = move
+        return move
+
+
+def flip_move(code):
+    """
+    Gets the code of the given move on the board turned half a turn, where square s is
+    square 31 - s.
+    """
+    try:
+        return _flipped_moves[code]
+    except KeyError:
+        flipped = encode_squares([NUM_SQUARES - 1 - square for square in decode_squares(code)])
+        _flipped_moves[code] = flipped
+        return flipped
+
+
+def get_start_square(code):
+    return (code >> LENGTH_BITS) & SQUARE_MASK
+
+
+def get_end_square(code):
+    return (code >> (LENGTH_BITS + SQUARE_BITS * ((code & LENGTH_MASK) + 1))) & SQUARE_MASK
+
+
+def get_jump_count(code):
+    """
+    Gets the number of pieces the given move captures, 0 for a simple move.
+    """
+    squares = decode_squares(code)
+    if abs(squares[0] // WIDTH - squares[1] // WIDTH) == 2:
+        return len(squares) - 1
+    return 0
+
+
+def convert_action_keys(actions):
+    """
+    Gets a copy of one state's action dictionary keyed by move codes instead of the
+    old ((y1,x1),(y2,x2)) tuples. Old keys only held the first step of a multiple jump,
+    so those entries become the code of a single jump.
+    """
+    return {encode_move(action) if isinstance(action, tuple) else action: value for action, value in actions.items()}
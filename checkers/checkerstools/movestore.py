@@ -0,0 +1,140 @@
+"""
+NOTES:
+-Keeps the teacher's search results on disk in an SQLite database, one row per
+(depth, board key), so results can be added and looked up one at a time instead of
+rewriting a whole pickle
+-The database runs in WAL mode, so several trainer processes can read and write the same
+file at once; a writer that finds the database locked waits up to TIMEOUT seconds
+-Zobrist keys are unsigned 64 bit numbers, but SQLite integers are signed, so keys are
+stored shifted into the signed range
+-Replaces the old checkers_table{depth}.pkl files, which import_pickle can read in
+-New results wait in memory until the next flush, which happens by itself once
+MAX_PENDING of them are waiting
+"""
+
+
+import os
+import pickle
+import sqlite3
+
+from checkerstools.moves import encode_move
+
+DEFAULT_PATH = 'checkers_moves.db'
+TIMEOUT = 30
+MAX_PENDING = 10000
+
+
+def _to_signed(key):
+    return key - (1 << 64) if key >= (1 << 63) else key
+
+
+def _to_unsigned(key):
+    return key + (1 << 64) if key < 0 else key
+
+
+class MoveStore:
+    """
+    An on-disk table of teacher search results, (value, move) keyed by search depth and
+    board key.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        """
+        Opens the store at the given path, creating it if it does not exist.
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=TIMEOUT)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS moves ("
+                                    "depth INTEGER NOT NULL, "
+                                    "board_key INTEGER NOT NULL, "
+                                    "value REAL, "
+                                    "move INTEGER, "
+                                    "PRIMARY KEY (depth, board_key)) WITHOUT ROWID")
+        # Rows waiting for the next flush
+        self.pending = {}
+
+    def get(self, depth, board_key):
+        """
+        Gets the (value, move) stored for the board at the given depth, or None.
+        """
+        if (depth, board_key) in self.pending:
+            return self.pending[(depth, board_key)]
+        row = self.connection.execute("SELECT value, move FROM moves WHERE depth = ? AND board_key = ?",
+                                      (depth, _to_signed(board_key))).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1]
+
+    def put(self, depth, board_key, value, move):
+        """
+        Adds a result. It is only written to disk by the next flush.
+        """
+        self.pending[(depth, board_key)] = (value, move)
+        if len(self.pending) >= MAX_PENDING:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes every pending result in one transaction.
+        """
+        if not self.pending:
+            return
+        rows = [(depth, _to_signed(board_key), value, move) for (depth, board_key), (value, move) in self.pending.items()]
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO moves (depth, board_key, value, move) VALUES (?, ?, ?, ?)", rows)
+        self.pending = {}
+
+    def count(self, depth=None):
+        """
+        Gets the number of results on disk, for one depth or for all of them.
+        """
+        if depth is None:
+            return self.connection.execute("SELECT COUNT(*) FROM moves").fetchone()[0]
+        return self.connection.execute("SELECT COUNT(*) FROM moves WHERE depth = ?", (depth,)).fetchone()[0]
+
+    def items(self, depth):
+        """
+        Yields (board key, (value, move)) for every result on disk at the given depth.
+        """
+        for board_key, value, move in self.connection.execute("SELECT board_key, value, move FROM moves WHERE depth = ?", (depth,)):
+            yield _to_unsigned(board_key), (value, move)
+
+    def import_pickle(self, path, depth):
+        """
+        Adds the results of an old checkers_table{depth}.pkl file (a dictionary of board
+        key: (value, move), with Zobrist keys, see convertkeys.py) and returns how many
+        there were. Moves saved as lists of locations are stored as move codes.
+        """
+        with open(path, 'rb') as handle:
+            moves_dict = pickle.load(handle)
+        for board_key, (value, move) in moves_dict.items():
+            if move is not None and not isinstance(move, int):
+                move = encode_move(move)
+            self.put(depth, board_key, value, move)
+        self.flush()
+        return len(moves_dict)
+
+    def compact(self):
+        """
+        Rebuilds the database file without unused pages and folds the write-ahead log back
+        into it. VACUUM writes through the log in WAL mode, so the checkpoint comes last.
+        """
+        self.flush()
+        self.connection.execute("VACUUM")
+        self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def get_size(self):
+        """
+        Gets the size on disk in bytes of the database and its write-ahead log.
+        """
+        return sum(os.path.getsize(path) for path in (self.path, self.path + '-wal') if os.path.isfile(path))
+
+    def close(self):
+        """
+        Writes any pending results and closes the database.
+        """
+        self.flush()
+        self.connection.close()
@@ -0,0 +1,68 @@
+"""
+NOTES:
+-Holds the teacher's moves for the positions near the start of the game, searched
+deeply ahead of time (see makebook.py), so the teacher does not search them again in
+every training game
+-Only positions with player 1, the teacher, to move are kept. They are found by playing
+every move from the start position, with either side moving first, up to a number of plies
+-Positions are keyed by their Zobrist key with the side to move xored in (see
+zobrist.get_side_key), as in the transposition table
+-The file is a header followed by one (key, move code, value) record per position,
+sorted by key. It is memory mapped and probed with a binary search, so it is never
+read in as a whole
+-Move codes take 4 bits plus 5 per square visited (see moves.py), so long jump chains
+need the full 64 bit move field. Version 1 books had 32 bit fields and are not read
+-Positions whose search found no move, such as decided ones, are not in the book, so
+the teacher searches them as usual
+"""
+
+
+import mmap
+import struct
+
+DEFAULT_PATH = 'checkers_book.bin'
+MAGIC = b'CKBK'
+VERSION = 2
+# Magic, version, plies expanded, depth searched, number of records
+HEADER = struct.Struct('<4sHHII')
+# Key, move code, value for player 1
+RECORD = struct.Struct('<QQf')
+
+
+class OpeningBook:
+    """
+    A memory mapped opening book file, probed with the key of a position.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        """
+        Opens the book file at the given path.
+        """
+        self.path = path
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.plies, self.depth, self.size = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} checkers opening book")
+
+    def probe(self, key):
+        """
+        Gets the (move, value) stored for the position with the given key (see the
+        notes), or None if the book does not hold it.
+        """
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            record_key, move, value = RECORD.unpack_from(self.data, HEADER.size + middle * RECORD.size)
+            if record_key == key:
+                return move, value
+            if record_key < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def close(self):
+        self.data.close()
+        self.file.close()
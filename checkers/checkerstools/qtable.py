@@ -0,0 +1,335 @@
+"""
+NOTES:
+-Holds a learner's Q-values in a few flat NumPy arrays instead of a dictionary of
+dictionaries, which took well over a hundred bytes per state-action pair
+-Each state gets one row: a run of entries, one per legal move, made the first time the
+state is seen. A state's legal moves never change, so rows never grow and are laid out
+one after another. starts[row] is the index of a row's first entry and lengths[row] the
+number of entries in it
+-Every entry is a move code (int64) and a float32 value. MC off-policy learners also
+keep their visit weights C in a float32 array with the same layout, made the first time
+one is set
+-The only dictionary left maps each state key to its row number
+-In sparse mode, reading a state that is not in the table gives zeros and adds nothing.
+A row is only made when one of its values is changed, and only holds the actions that
+have been. When another action of the state is updated, the row is copied to
+the end of the arrays with the new entry added, and the old copy is left unused until
+the table is compacted (see compact). Unseen pairs are worth zero in either mode, so
+both learn exactly the same values
+-Rows are handed out in the order states are first seen, so the table pickles as its
+arrays, compacted, plus the state keys in row order, and the dictionary is rebuilt on
+loading. save and load write and read the same arrays as a .npz file
+"""
+
+
+import sys
+
+import numpy as np
+
+DEFAULT_CAPACITY = 1024
+
+
+class QTable:
+    """
+    Q-values, and optionally visit weights, of state-action pairs keyed by state key and
+    move code, stored in contiguous arrays.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, sparse=False):
+        """
+        Makes an empty table with room for the given number of entries and rows before
+        its arrays have to grow. A sparse table only stores updated values (see the notes).
+        """
+        self.sparse = sparse
+        self.rows = {}
+        self.size = 0
+        # Entries left behind by rows copied to the end of the arrays
+        self.unused = 0
+        self.starts = np.zeros(capacity, dtype=np.int64)
+        self.lengths = np.zeros(capacity, dtype=np.uint8)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.values = np.zeros(capacity, dtype=np.float32)
+        self.counts = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, s):
+        return s in self.rows
+
+    def reserve(self, entries):
+        """
+        Makes room for the given number of entries after the last one in use, and
+        returns the index of the first.
+        """
+        start, end = self.size, self.size + entries
+        if end > len(self.values):
+            self.actions = self.grow(self.actions, end)
+            self.values = self.grow(self.values, end)
+            if self.counts is not None:
+                self.counts = self.grow(self.counts, end)
+        self.size = end
+        return start
+
+    def add_row(self, s, actions):
+        """
+        Adds a row of zero valued entries for the given actions of state s and returns
+        its row number.
+        """
+        row = len(self.rows)
+        if row >= len(self.starts):
+            self.starts = self.grow(self.starts, row + 1)
+            self.lengths = self.grow(self.lengths, row + 1)
+        start = self.reserve(len(actions))
+        self.actions[start:start + len(actions)] = actions
+        self.starts[row] = start
+        self.lengths[row] = len(actions)
+        self.rows[s] = row
+        return row
+
+    @staticmethod
+    def grow(array, minimum):
+        """
+        Gets a copy of the array at least minimum long, doubling it so appending rows
+        takes amortised constant time. The new part is zero.
+        """
+        grown = np.zeros(max(2 * len(array), minimum), dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def get_bounds(self, row):
+        start = int(self.starts[row])
+        return start, start + int(self.lengths[row])
+
+    def get_values(self, s, actions):
+        """
+        Gets the values of the given actions of state s in the same order. If s has not
+        been seen, a zero valued row is added, or in sparse mode zeros are returned and
+        nothing is added. The result is a view of the table when the actions are the
+        row's actions in order, which they are when they come from the same move
+        generator, so it must not be kept past the next change.
+        """
+        row = self.rows.get(s)
+        if row is None:
+            if self.sparse or not actions:
+                return np.zeros(len(actions), dtype=np.float32)
+            row = self.add_row(s, actions)
+        start, end = self.get_bounds(row)
+        row_actions = self.actions[start:end].tolist()
+        if row_actions == actions:
+            return self.values[start:end]
+        positions = dict(zip(row_actions, range(start, end)))
+        return np.array([self.values[positions[a]] if a in positions else 0 for a in actions], dtype=np.float32)
+
+    def get_row(self, s):
+        """
+        Gets {action: value} for state s, or an empty dictionary if s has not been seen.
+        """
+        row = self.rows.get(s)
+        if row is None:
+            return {}
+        start, end = self.get_bounds(row)
+        return dict(zip(self.actions[start:end].tolist(), self.values[start:end].tolist()))
+
+    def index(self, s, a):
+        """
+        Gets the index of the entry for action a in state s. Raises KeyError if there is
+        none, as a dictionary would.
+        """
+        start, end = self.get_bounds(self.rows[s])
+        try:
+            return start + self.actions[start:end].tolist().index(a)
+        except ValueError:
+            raise KeyError((s, a)) from None
+
+    def get_entry(self, s, a):
+        """
+        Gets the index of the entry for action a in state s to update, adding the entry
+        if the table does not hold it yet, which only happens in sparse mode. Adding an
+        entry can replace the arrays, so they must be read from the table again after.
+        """
+        row = self.rows.get(s)
+        if row is None:
+            row = self.add_row(s, [a])
+            return int(self.starts[row])
+        start, end = self.get_bounds(row)
+        row_actions = self.actions[start:end].tolist()
+        if a in row_actions:
+            return start + row_actions.index(a)
+        # Copy the row to the end of the arrays with room for the new entry
+        length = end - start
+        new_start = self.reserve(length + 1)
+        for array in (self.actions, self.values, self.counts):
+            if array is not None:
+                array[new_start:new_start + length] = array[start:end]
+        self.actions[new_start + length] = a
+        self.starts[row] = new_start
+        self.lengths[row] = length + 1
+        self.unused += length
+        return new_start + length
+
+    def get(self, s, a):
+        """
+        Gets the value of action a in state s, zero if the table does not hold it.
+        """
+        try:
+            return float(self.values[self.index(s, a)])
+        except KeyError:
+            return 0.0
+
+    def add(self, s, a, delta):
+        """
+        Adds delta to the value of action a in state s. Adding zero changes nothing, so
+        in sparse mode it does not make an entry either, e.g. while testing with alpha 0.
+        """
+        if delta != 0:
+            i = self.get_entry(s, a)
+            self.values[i] += delta
+
+    def get_counts(self):
+        """
+        Gets the visit weight array, with the same layout as the values, making it on first use.
+        """
+        if self.counts is None:
+            self.counts = np.zeros(len(self.values), dtype=np.float32)
+        return self.counts
+
+    def get_live_entries(self):
+        """
+        Gets the indexes of the entries in use, row by row, and the start of each row
+        within them.
+        """
+        rows = len(self.rows)
+        lengths = self.lengths[:rows].astype(np.int64)
+        new_starts = np.zeros(rows + 1, dtype=np.int64)
+        np.cumsum(lengths, out=new_starts[1:])
+        entries = np.repeat(self.starts[:rows] - new_starts[:-1], lengths) + np.arange(new_starts[-1])
+        return entries, new_starts
+
+    def compact(self, strip_zeros=False):
+        """
+        Rewrites the arrays without the entries left unused by copied rows or room to
+        grow. With strip_zeros, entries whose value (and visit weight) is zero are
+        removed too, along with rows left empty, and the table becomes sparse since
+        their states no longer hold every action. Returns the number of entries removed.
+        """
+        buffers = self.get_buffers()
+        removed = self.size - len(buffers['values'])
+        if strip_zeros:
+            keep = buffers['values'] != 0
+            if 'counts' in buffers:
+                keep |= buffers['counts'] != 0
+            removed += len(keep) - int(keep.sum())
+            lengths = np.add.reduceat(keep.astype(np.int64), buffers['starts'][:-1]) if len(keep) else np.zeros(0, dtype=np.int64)
+            # reduceat gives an empty row the entry at its start, so empty rows are set apart
+            lengths[np.diff(buffers['starts']) == 0] = 0
+            kept_rows = lengths > 0
+            starts = np.zeros(int(kept_rows.sum()) + 1, dtype=np.int64)
+            np.cumsum(lengths[kept_rows], out=starts[1:])
+            buffers = {name: array[keep] for name, array in buffers.items() if name not in ('keys', 'starts', 'sparse')}
+            buffers.update({'keys': self.get_keys()[kept_rows], 'starts': starts, 'sparse': np.array(True)})
+        self.set_buffers(buffers)
+        return removed
+
+    def get_memory_usage(self):
+        """
+        Gets the number of states, entries in use and unused entries, and the bytes taken
+        by the arrays (as allocated, including room to grow) and by the state key dictionary.
+        """
+        arrays = self.starts.nbytes + self.lengths.nbytes + self.actions.nbytes + self.values.nbytes
+        if self.counts is not None:
+            arrays += self.counts.nbytes
+        index = sys.getsizeof(self.rows) + sum(sys.getsizeof(s) for s in self.rows)
+        return {
+            'states': len(self.rows),
+            'entries': self.size - self.unused,
+            'unused': self.unused,
+            'array_bytes': arrays,
+            'index_bytes': index,
+            'total_bytes': arrays + index,
+        }
+
+    def get_keys(self):
+        return np.fromiter(self.rows, dtype=np.uint64, count=len(self.rows))
+
+    def get_buffers(self):
+        """
+        Gets the table as a dictionary of NumPy arrays holding only the entries in use,
+        with the rows one after another and starts[row + 1] the end of each row.
+        """
+        entries, starts = self.get_live_entries()
+        buffers = {
+            'keys': self.get_keys(),
+            'starts': starts,
+            'actions': self.actions[entries],
+            'values': self.values[entries],
+            'sparse': np.array(self.sparse),
+        }
+        if self.counts is not None:
+            buffers['counts'] = self.counts[entries]
+        return buffers
+
+    def set_buffers(self, buffers):
+        """
+        Replaces the table's contents with arrays as given by get_buffers.
+        """
+        keys = buffers['keys']
+        starts = np.array(buffers['starts'], dtype=np.int64)
+        self.rows = dict(zip(keys.tolist(), range(len(keys))))
+        self.starts = starts[:-1].copy()
+        self.lengths = np.diff(starts).astype(np.uint8)
+        self.actions = np.array(buffers['actions'], dtype=np.int64)
+        self.values = np.array(buffers['values'], dtype=np.float32)
+        counts = buffers.get('counts')
+        self.counts = None if counts is None else np.array(counts, dtype=np.float32)
+        self.sparse = bool(buffers.get('sparse', False))
+        self.size = len(self.values)
+        self.unused = 0
+
+    def __getstate__(self):
+        return self.get_buffers()
+
+    def __setstate__(self, buffers):
+        self.set_buffers(buffers)
+
+    def save(self, path):
+        """
+        Writes the table's arrays to a .npz file.
+        """
+        np.savez(path, **self.get_buffers())
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a table written by save.
+        """
+        table = cls(0)
+        with np.load(path) as data:
+            table.set_buffers({name: data[name] for name in data.files})
+        return table
+
+    @classmethod
+    def from_dicts(cls, Q, C=None, sparse=False):
+        """
+        Makes a table from the {state: {action: value}} dictionaries learners used to
+        keep, with C as the visit weights if given.
+        """
+        table = cls(sum(len(actions) for actions in Q.values()), sparse)
+        for s, actions in Q.items():
+            if not actions:
+                continue
+            row = table.add_row(s, list(actions))
+            start = table.starts[row]
+            table.values[start:start + len(actions)] = list(actions.values())
+        if C:
+            for s, actions in C.items():
+                for a, count in actions.items():
+                    i = table.get_entry(s, a)
+                    table.get_counts()[i] = count
+        return table
+
+    def to_dict(self):
+        """
+        Gets the values as {state: {action: value}} dictionaries, e.g. for the web app.
+        """
+        return {s: self.get_row(s) for s in self.rows}
@@ -0,0 +1,76 @@
+"""
+NOTES:
+-Adds up the teacher's per move search statistics (see Alpha_beta.get_search_stats)
+over a block of moves, e.g. the games between two training checkpoints
+-Moves are counted by where they came from: 'random' (the teacher played a random
+move), 'forced' (there was only one move), 'book', 'store' (a stored result),
+'ponder' (searched ahead of time by pondering) or 'search'. Depths are only averaged
+over searched moves
+-get_summary gives a flat dictionary which write_json_line appends to a JSON lines
+file, one line per block
+"""
+
+
+import json
+
+SOURCES = ('random', 'forced', 'book', 'store', 'ponder', 'search')
+# Per move counts which are summed over the block
+COUNTS = ('nodes', 'cutoffs', 'first_move_cutoffs', 'tt_probes', 'tt_hits', 'tablebase_hits')
+
+
+class SearchStats:
+    """
+    Totals of the teacher's search statistics over a block of moves.
+    """
+
+    def __init__(self):
+        self.moves = 0
+        self.sources = dict.fromkeys(SOURCES, 0)
+        self.totals = dict.fromkeys(COUNTS, 0)
+        self.seconds = 0.0
+        self.depth_total = 0
+        self.max_depth = 0
+        self.max_nodes = 0
+
+    def add(self, stats):
+        """
+        Adds the statistics of one move, as given by Alpha_beta.get_search_stats.
+        """
+        self.moves += 1
+        self.sources[stats['source']] += 1
+        for name in COUNTS:
+            self.totals[name] += stats[name]
+        self.seconds += stats['seconds']
+        if stats['source'] == 'search':
+            self.depth_total += stats['completed_depth']
+            self.max_depth = max(self.max_depth, stats['completed_depth'])
+        self.max_nodes = max(self.max_nodes, stats['nodes'])
+
+    def get_summary(self):
+        """
+        Gets the block's totals, with the rates worked out from them.
+        """
+        totals = self.totals
+        searched = self.sources['search']
+        summary = {'moves': self.moves}
+        summary.update({f'{source}_moves': count for source, count in self.sources.items()})
+        summary.update(totals)
+        summary.update({
+            'seconds': self.seconds,
+            'nodes_per_sec': totals['nodes'] / self.seconds if self.seconds > 0 else 0.0,
+            'mean_depth': self.depth_total / searched if searched else 0.0,
+            'max_depth': self.max_depth,
+            'max_nodes': self.max_nodes,
+            'first_move_rate': totals['first_move_cutoffs'] / totals['cutoffs'] if totals['cutoffs'] else 0.0,
+            'tt_hit_rate': totals['tt_hits'] / totals['tt_probes'] if totals['tt_probes'] else 0.0,
+        })
+        return summary
+
+    def write_json_line(self, path, **fields):
+        """
+        Appends the summary, with any extra fields first, to the JSON lines file at path.
+        """
+        record = dict(fields)
+        record.update(self.get_summary())
+        with open(path, 'a') as handle:
+            handle.write(json.dumps(record) + '\n')
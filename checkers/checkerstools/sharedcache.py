@@ -0,0 +1,219 @@
+"""
+NOTES:
+-A table of the teacher's search results in shared memory, which every trainer process
+on the machine opens by name, so a result one trainer finds can be used by the others
+straight away instead of after the next save of the move store
+-The table is open addressed: a result goes in one of PROBE_LENGTH slots starting at
+the slot given by the low bits of its key, and when all of them are taken the last one
+is overwritten, so the table never grows past the size it was made with
+-Each slot is three 64 bit words: the check word, then the depth and move, then the
+value's bits. The check word is the board key xored with the other two words, so a
+slot another process is halfway through writing does not match any key and reads as
+empty. This needs no locks
+-The depth and move word holds the depth in its low 8 bits, then a bit set in every
+slot in use, so an empty slot is told apart from a depth 0 result with no move, then a
+bit set when there is a move, then the move code. Move codes take 5 bits per square
+visited (see moves.py), and moves too long for the bits left are not put in the table,
+only in the store
+-The first process to open the table makes it. It is not removed when the trainers
+exit, so the results stay for the next run; remove_table removes it (see storetool.py),
+as it must a table left by an older version with another layout
+-Results looked up or put through the table are also passed on to the move store
+behind it, if there is one
+"""
+
+
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+DEFAULT_NAME = 'checkers_teacher_cache'
+DEFAULT_SIZE_BITS = 20
+MAGIC = 0x434B534843414332
+# Magic and number of slots
+HEADER_WORDS = 2
+SLOT_WORDS = 3
+WORD_SIZE = 8
+PROBE_LENGTH = 4
+# Seconds to wait for the process that made the table to finish setting it up
+ATTACH_TIMEOUT = 5
+KEY_MASK = (1 << 64) - 1
+DEPTH_BITS = 8
+USED_FLAG = 1 << DEPTH_BITS
+MOVE_FLAG = 1 << (DEPTH_BITS + 1)
+MOVE_SHIFT = DEPTH_BITS + 2
+MAX_MOVE = KEY_MASK >> MOVE_SHIFT
+DOUBLE = struct.Struct('<d')
+WORD = struct.Struct('<Q')
+
+
+def _to_bits(value):
+    return WORD.unpack(DOUBLE.pack(value))[0]
+
+
+def _from_bits(bits):
+    return DOUBLE.unpack(WORD.pack(bits))[0]
+
+
+def remove_table(name=DEFAULT_NAME):
+    """
+    Removes the shared table with the given name, whatever its layout. Returns False if
+    there is none.
+    """
+    try:
+        memory = shared_memory.SharedMemory(name)
+    except FileNotFoundError:
+        return False
+    memory.close()
+    memory.unlink()
+    return True
+
+
+class SharedMoveCache:
+    """
+    A fixed size table of (value, move) results keyed by search depth and board key, in
+    shared memory, in front of an optional MoveStore.
+    """
+
+    def __init__(self, store=None, name=DEFAULT_NAME, size_bits=DEFAULT_SIZE_BITS):
+        """
+        Opens the shared table with the given name, making it with 2 ** size_bits slots if
+        no process has made it yet.
+        """
+        self.store = store
+        self.name = name
+        try:
+            self.memory = shared_memory.SharedMemory(name, create=True,
+                                                     size=(HEADER_WORDS + SLOT_WORDS * (1 << size_bits)) * WORD_SIZE)
+            created = True
+        except FileExistsError:
+            self.memory = shared_memory.SharedMemory(name)
+            created = False
+        # Python would otherwise remove the table when this process exits, while other
+        # trainers are still using it
+        resource_tracker.unregister(self.memory._name, 'shared_memory')
+        self.words = self.memory.buf.cast('Q')
+        if created:
+            self.words[1] = 1 << size_bits
+            self.words[0] = MAGIC
+        else:
+            deadline = time.perf_counter() + ATTACH_TIMEOUT
+            while self.words[0] != MAGIC:
+                if time.perf_counter() > deadline:
+                    self.close()
+                    raise ValueError(f"Shared memory {name} is not a teacher cache of this version; "
+                                     f"remove it with storetool.py unshare")
+                time.sleep(0.01)
+        self.size = self.words[1]
+        self.mask = self.size - 1
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def get_slot(self, depth, board_key):
+        """
+        Gets the word index of the slot holding the result, or None.
+        """
+        words = self.words
+        index = (board_key ^ depth) & self.mask
+        for _ in range(PROBE_LENGTH):
+            slot = HEADER_WORDS + index * SLOT_WORDS
+            depth_move = words[slot + 1]
+            if depth_move & USED_FLAG and depth_move & 0xFF == depth and words[slot] ^ depth_move ^ words[slot + 2] == board_key:
+                return slot
+            index = (index + 1) & self.mask
+        return None
+
+    def get(self, depth, board_key):
+        """
+        Gets the (value, move) for the board at the given depth, from the shared table if
+        it is there and otherwise from the store, or None if neither has it.
+        """
+        slot = self.get_slot(depth, board_key)
+        if slot is not None:
+            depth_move, value_bits = self.words[slot + 1], self.words[slot + 2]
+            # Check the slot again in case another process wrote to it while it was read
+            if self.words[slot] ^ depth_move ^ value_bits == board_key:
+                self.hits += 1
+                move = depth_move >> MOVE_SHIFT if depth_move & MOVE_FLAG else None
+                return _from_bits(value_bits), move
+        self.misses += 1
+        if self.store is None:
+            return None
+        result = self.store.get(depth, board_key)
+        if result is not None:
+            self.write(depth, board_key, *result)
+        return result
+
+    def put(self, depth, board_key, value, move):
+        """
+        Adds a result to the shared table and the store.
+        """
+        self.write(depth, board_key, value, move)
+        if self.store is not None:
+            self.store.put(depth, board_key, value, move)
+
+    def write(self, depth, board_key, value, move):
+        """
+        Writes a result to the first empty slot in its probe sequence, its own slot if it
+        is already there, or else the last slot of the sequence. A move too long to fit
+        (see the notes) is not written.
+        """
+        if move is not None and move > MAX_MOVE:
+            return
+        words = self.words
+        index = (board_key ^ depth) & self.mask
+        for _ in range(PROBE_LENGTH):
+            slot = HEADER_WORDS + index * SLOT_WORDS
+            depth_move = words[slot + 1]
+            if not depth_move & USED_FLAG or (depth_move & 0xFF == depth and words[slot] ^ depth_move ^ words[slot + 2] == board_key):
+                break
+            index = (index + 1) & self.mask
+        else:
+            self.overwrites += 1
+        depth_move = depth | USED_FLAG
+        if move is not None:
+            depth_move |= MOVE_FLAG | move << MOVE_SHIFT
+        value_bits = _to_bits(value)
+        words[slot] = 0
+        words[slot + 1] = depth_move
+        words[slot + 2] = value_bits
+        words[slot] = (board_key ^ depth_move ^ value_bits) & KEY_MASK
+        self.stores += 1
+
+    def count(self):
+        """
+        Gets the number of slots in use.
+        """
+        words = self.words
+        return sum(1 for slot in range(HEADER_WORDS + 1, HEADER_WORDS + self.size * SLOT_WORDS, SLOT_WORDS) if words[slot] & USED_FLAG)
+
+    def get_stats(self):
+        """
+        Gets this process's hit, miss, store and overwrite counts.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'stores': self.stores,
+            'overwrites': self.overwrites,
+        }
+
+    def close(self):
+        """
+        Closes this process's view of the table. The table itself is kept.
+        """
+        self.words.release()
+        self.memory.close()
+
+    def unlink(self):
+        """
+        Removes the table, once every process has closed it.
+        """
+        self.close()
+        # unlink unregisters the table from the resource tracker, which it no longer is
+        resource_tracker.register(self.memory._name, 'shared_memory')
+        self.memory.unlink()
@@ -0,0 +1,246 @@
+"""
+NOTES:
+-Solves every position with up to max_pieces pieces by retrograde analysis: positions
+where the side to move has no moves are lost, then positions one move from those are
+won, positions whose moves all lead to won positions are lost, and so on, one ply at a
+time. Positions never reached this way are draws
+-The 50 move draw rule is not taken into account, as in the teacher's search
+-A capture always leads to a position with fewer pieces, so the positions are solved in
+slices by piece count, fewest first, and a slice only needs the slices before it
+-Each position takes one byte in the file: 0 for a draw, or the number of plies to the
+end of the game plus one. The side to move wins if that number of plies is odd (it
+makes the last move) and loses if it is even, so no separate result bits are needed
+-Only positions with player 1 to move are stored. A position with player 2 to move
+plays the same as the board turned half a turn with the colours swapped, with player 1
+to move (see zobrist.py), so it is flipped before it is probed, and the children of a
+position are flipped as they are indexed. This halves the file
+-Positions are indexed by the set of occupied squares (ranked with the combinatorial
+number system), then the pieces on those squares in square order (two bits each).
+Piece placements that can not happen, like a man on its king row, are given indexes
+too and are stored as draws
+-The file is memory mapped when probed, so only the pages in use are read from disk
+"""
+
+
+import array
+import itertools
+import math
+import mmap
+
+import numpy as np
+
+from checkerstools.bitboard import BitBoard, NUM_SQUARES, P1_KING_ROW, P2_KING_ROW, flip_state
+
+DEFAULT_PATH = 'checkers_tablebase.bin'
+MAGIC = b'CKTB'
+VERSION = 2
+HEADER_SIZE = 8
+DRAW = 0
+# Distances have to fit in a byte
+MAX_CODE = 255
+# The value the teacher gives a won position, less one per ply it takes to win
+WIN_VALUE = 1000000
+# Any value at least this far from zero is a decided result
+DECIDED_VALUE = WIN_VALUE - MAX_CODE
+
+# COMBINATIONS[n][k] is n choose k
+COMBINATIONS = [[math.comb(n, k) for k in range(NUM_SQUARES + 1)] for n in range(NUM_SQUARES + 1)]
+# Piece numbers used in the index
+P1_MAN, P1_KING, P2_MAN, P2_KING = range(4)
+
+
+def get_slice_size(num_pieces):
+    """
+    Gets the number of indexes for positions with the given number of pieces.
+    """
+    return COMBINATIONS[NUM_SQUARES][num_pieces] * 4 ** num_pieces
+
+
+def get_slice_offsets(max_pieces):
+    """
+    Gets the index each slice of positions starts at, from 1 piece up to max_pieces (and
+    one past the last slice), with no slice for 0 pieces.
+    """
+    offsets = [0, 0]
+    for num_pieces in range(1, max_pieces + 1):
+        offsets.append(offsets[-1] + get_slice_size(num_pieces))
+    return offsets
+
+
+def get_index(p1, p2, kings, offsets):
+    """
+    Gets the index of the position with the given bitboard masks and player 1 to move.
+    """
+    rank = 0
+    pieces = 0
+    num_pieces = 0
+    occupied = p1 | p2
+    while occupied:
+        bit = occupied & -occupied
+        square = bit.bit_length() - 1
+        num_pieces += 1
+        rank += COMBINATIONS[square][num_pieces]
+        piece = (P1_MAN if p1 & bit else P2_MAN) + (1 if kings & bit else 0)
+        pieces |= piece << (2 * (num_pieces - 1))
+        occupied ^= bit
+    return offsets[num_pieces] + ((rank << (2 * num_pieces)) | pieces)
+
+
+def get_value(code):
+    """
+    Gets the teacher's value of a position for the side to move from its tablebase code.
+    """
+    if code == DRAW:
+        return 0
+    plies = code - 1
+    if plies % 2 == 1:
+        return WIN_VALUE - plies
+    return plies - WIN_VALUE
+
+
+class Tablebase:
+    """
+    A memory mapped tablebase file, probed with the bitboard masks of a position.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        """
+        Opens the tablebase file at the given path.
+        """
+        self.path = path
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC or self.data[len(MAGIC)] != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} checkers tablebase")
+        self.max_pieces = self.data[len(MAGIC) + 1]
+        self.offsets = get_slice_offsets(self.max_pieces)
+        self.probes = 0
+
+    def probe(self, p1, p2, kings, player_turn):
+        """
+        Gets the code of the position (see the notes), or None if it has too many pieces.
+        """
+        if (p1 | p2).bit_count() > self.max_pieces:
+            return None
+        self.probes += 1
+        if not player_turn:
+            p1, p2, kings = flip_state(p1, p2, kings)
+        return self.data[HEADER_SIZE + get_index(p1, p2, kings, self.offsets)]
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+def get_positions(num_pieces):
+    """
+    Yields (index within the slice, p1, p2, kings) for every legal position with the
+    given number of pieces and player 1 to move, where both sides have a piece.
+    """
+    for squares in itertools.combinations(range(NUM_SQUARES), num_pieces):
+        rank = sum(COMBINATIONS[square][j + 1] for j, square in enumerate(squares))
+        bits = [1 << square for square in squares]
+        for pieces in itertools.product(range(4), repeat=num_pieces):
+            p1 = p2 = kings = 0
+            legal = True
+            for bit, piece in zip(bits, pieces):
+                if piece == P1_MAN:
+                    p1 |= bit
+                    legal = legal and not bit & P1_KING_ROW
+                elif piece == P1_KING:
+                    p1 |= bit
+                    kings |= bit
+                elif piece == P2_MAN:
+                    p2 |= bit
+                    legal = legal and not bit & P2_KING_ROW
+                else:
+                    p2 |= bit
+                    kings |= bit
+            if not legal or not p1 or not p2:
+                continue
+            # The first piece is the lowest two bits of the index, as in get_index
+            packed = sum(piece << (2 * j) for j, piece in enumerate(pieces))
+            yield (rank << (2 * num_pieces)) | packed, p1, p2, kings
+
+
+def solve_slice(num_pieces, codes, offsets):
+    """
+    Fills in the codes of every position with num_pieces pieces. codes already holds
+    the solved slices with fewer pieces, which the captures lead to.
+    """
+    offset = offsets[num_pieces]
+    board = BitBoard()
+    # Positions with at least one move, the start of their children in children, and
+    # the children themselves, as 32 bit arrays to keep the larger slices in memory
+    movers = array.array('i')
+    starts = array.array('i')
+    children = array.array('i')
+    for index, p1, p2, kings in get_positions(num_pieces):
+        board.set_state((p1, p2, kings))
+        moves = board.get_possible_next_moves(True)
+        if not moves:
+            # Lost, with no plies left to play
+            codes[offset + index] = 1
+            continue
+        movers.append(offset + index)
+        starts.append(len(children))
+        for move in moves:
+            board.set_state((p1, p2, kings))
+            board.make_move(move)
+            if board.p1 and board.p2:
+                # Player 2 is to move in the child, so it is stored flipped
+                children.append(get_index(*flip_state(board.p1, board.p2, board.kings), offsets))
+            else:
+                # The last piece was captured, so the side to move has lost
+                children.append(-1)
+
+    movers = np.frombuffer(movers, dtype=np.int32)
+    starts = np.frombuffer(starts, dtype=np.int32)
+    children = np.frombuffer(children, dtype=np.int32).copy()
+    counts = np.diff(np.append(starts, len(children)))
+    # Point captures of the last piece at a lost position
+    lost_index = len(codes)
+    codes = np.append(codes, np.int16(1))
+    children[children == -1] = lost_index
+
+    unsolved = np.ones(len(movers), dtype=bool)
+    plies = 0
+    last_change = 0
+    # Children from earlier slices can be decided further away than anything in this one
+    furthest = int(codes[:offset].max()) if offset else 1
+    while unsolved.any() and (plies <= last_change + 2 or plies <= furthest):
+        plies += 1
+        child_codes = codes[children]
+        if plies % 2 == 1:
+            # Won: a move leads to a position lost in plies - 1
+            solved = np.logical_or.reduceat(child_codes == plies, starts)
+        else:
+            # Lost: every move leads to a position won in fewer than plies
+            won = (child_codes > 0) & (child_codes % 2 == 0) & (child_codes <= plies)
+            solved = np.add.reduceat(won, starts) == counts
+        solved &= unsolved
+        if solved.any():
+            if plies + 1 > MAX_CODE:
+                raise ValueError(f"Positions with {num_pieces} pieces take too many plies to store")
+            codes[movers[solved]] = plies + 1
+            unsolved &= ~solved
+            last_change = plies
+    return codes[:lost_index]
+
+
+def generate(max_pieces, path=DEFAULT_PATH, verbose=False):
+    """
+    Solves every position with up to max_pieces pieces and writes the tablebase to path.
+    """
+    offsets = get_slice_offsets(max_pieces)
+    codes = np.zeros(offsets[-1], dtype=np.int16)
+    for num_pieces in range(1, max_pieces + 1):
+        codes = solve_slice(num_pieces, codes, offsets)
+        if verbose:
+            part = codes[offsets[num_pieces]:offsets[num_pieces + 1]]
+            print(f"{num_pieces} pieces: {np.count_nonzero(part % 2 == 0) - np.count_nonzero(part == 0)} won, "
+                  f"{np.count_nonzero(part % 2 == 1)} lost, longest {int(part.max()) - 1} plies")
+    with open(path, 'wb') as handle:
+        handle.write(MAGIC + bytes([VERSION, max_pieces]) + bytes(HEADER_SIZE - len(MAGIC) - 2))
+        handle.write(codes.astype(np.uint8).tobytes())
@@ -1,10 +1,26 @@
 import random
-import copy
-import pickle
-import os
 import time
 import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from functools import reduce 
+from checkerstools.bitboard import BitBoard, NEIGHBOUR_TABLE, PIECE_DIRECTIONS
+from checkerstools.zobrist import PIECE_KEYS, FLIPPED_KEYS, hash_spots, hash_flipped_spots, get_side_key, get_canonical_key
+from checkerstools.movestore import MoveStore, DEFAULT_PATH
+from checkerstools.movecache import MoveCache, DEFAULT_ENTRIES
+from checkerstools.sharedcache import SharedMoveCache
+from checkerstools.tablebase import Tablebase, get_value, DECIDED_VALUE
+from checkerstools.openingbook import OpeningBook
+from checkerstools.searchstats import SearchStats
+from checkerstools.transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from checkerstools.moves import encode_move, decode_move, flip_move, get_start_square, get_end_square, get_jump_count
+
+class SearchTimeout(Exception):
+    """
+    Raised inside a search when the time budget of an iterative deepening search runs out.
+    """
+    pass
+
 
 class Teacher:
     """
@@ -35,6 +51,17 @@ class Teacher:
         """
         pass
 
+    # Whether start_pondering should be called after each of the AI's moves
+    pondering = False
+
+    def start_pondering(self, board, replies):
+        """
+        Should be overridden if AI implementing this class can think while the other
+        player moves. Called after the AI's move with the other player's likely replies,
+        most likely first.
+        """
+        pass
+
 
 class Alpha_beta(Teacher):
     """
@@ -44,17 +71,46 @@ class Alpha_beta(Teacher):
     1) Be able to take in any reward function (for when not win/loss) 
     so that you can make a more robust set of training AI
     """
+    # Deepest search tried by iterative deepening, however much time is left
+    MAX_ITERATIVE_DEPTH = 30
+    # Move ordering scores, highest first. History scores are capped below KILLER_SCORE
+    TT_MOVE_SCORE = 1 << 30
+    CAPTURE_SCORE = 1 << 24
+    PROMOTION_SCORE = 1 << 22
+    KILLER_SCORE = 1 << 20
+    # Most of the agent's replies searched ahead of time when pondering
+    MAX_PONDER_REPLIES = 4
     
-    def __init__(self, level=0.0, player_id=True, depth=2, the_board=None, use_dict=True):
+    def __init__(self, level=0.0, player_id=True, depth=2, the_board=None, use_dict=True, use_bitboard=True, tt_size_bits=20,
+                 time_budget_ms=None, use_move_ordering=True, workers=1, cache_entries=DEFAULT_ENTRIES,
+                 tablebase_path=None, book_path=None, ponder=False, shared_cache=None):
         """
-        Initialize the instance variables to be stored by the AI. 
+        Initialize the instance variables to be stored by the AI. The transposition table
+        has 2 ** tt_size_bits slots and is kept between searches. If time_budget_ms is
+        given, moves are chosen by iterative deepening within that many milliseconds
+        instead of by a search to self.depth. If use_move_ordering is False, moves are
+        searched in the order the Board generates them. If workers is more than 1, fixed
+        depth searches split the root moves over that many worker processes. Up to
+        cache_entries results of the move store are kept in memory. If tablebase_path is
+        given, positions with few enough pieces are looked up in that endgame tablebase
+        (see tablebase.py) instead of being searched. If book_path is given, moves are
+        looked up in that opening book (see openingbook.py) before searching. If ponder is
+        True, the positions after the agent's likely replies are searched in a background
+        process while the agent moves (see start_pondering). If shared_cache is given,
+        results are also kept in the shared memory table of that name (see
+        sharedcache.py), which other trainer processes read and write too.
         """
         self.board = the_board
         self.depth = depth
         self.player_id = player_id
         self.level = level
-        self.moves_dict = {}
+        self.move_store = None
+        self.move_cache = None
+        self.cache_entries = cache_entries
+        self.shared_cache_name = shared_cache
+        self.shared_cache = None
         self.board_key = None
+        self.decimal_key = None
         self.tested_states = 0
         self.teach_time =  time.perf_counter()
         self.agent_id = ""
@@ -62,6 +118,40 @@ class Alpha_beta(Teacher):
         self.dimensions = []
         self.draw_counter = 0
         self.use_dict = use_dict
+        self.use_bitboard = use_bitboard
+        self.transposition_table = TranspositionTable(tt_size_bits)
+        self.time_budget_ms = time_budget_ms
+        self.deadline = None
+        self.completed_depth = 0
+        self.use_move_ordering = use_move_ordering
+        # Two moves per remaining depth which last caused a cutoff there
+        self.killers = {}
+        # How much each move has caused cutoffs, weighted by the depth searched below it
+        self.history = {}
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.workers = workers
+        self.executor = None
+        # [alpha, index of the root move it came from] shared with the worker processes
+        self.shared_alpha = None
+        self.tablebase_path = tablebase_path
+        self.tablebase = Tablebase(tablebase_path) if tablebase_path is not None else None
+        self.tablebase_hits = 0
+        self.book = OpeningBook(book_path) if book_path is not None else None
+        self.book_hits = 0
+        self.search_start = time.perf_counter()
+        self.search_time = 0.0
+        self.move_source = 'search'
+        self.tt_probes = 0
+        self.tt_hits = 0
+        # Totals of get_search_stats over the moves since it was last replaced
+        self.search_stats = SearchStats()
+        self.pondering = ponder
+        self.ponder_executor = None
+        # Searches started by start_pondering, by (board key, depth)
+        self.ponder_futures = {}
+        # The roll deciding whether the next move is random, made early by start_pondering
+        self.next_roll = None
 
     def new_board(self, board, board_key):
         """
@@ -71,139 +161,450 @@ class Alpha_beta(Teacher):
         self.p_tokens = [board.P1, board.P1_K, board.P2, board.P2_K, board.EMPTY_SPOT]
         self.dimensions = [board.HEIGHT, board.WIDTH]
         self.board_key = board_key
+        self.decimal_key = board.get_decimal_key()
         self.draw_counter = board.draw_counter
 
     def save_moves_dict(self):
-        if self.use_dict == True:
-            while True:
-                try:
-                    # Store data (serialize)
-                    # Syncs the moves_dict with the file
-                    if os.path.isfile(f'checkers_table{self.depth}.pkl'):
-                        with open(f'checkers_table{self.depth}.pkl', 'rb') as handle:
-                                self.moves_dict.update(pickle.load(handle))
-                        # Save the new combined moves_dict
-    #                    with open(f'{self.agent_id}teachinfo.txt', 'a') as f:
-    #                        f.write(f"\n\nSaving. Moves dictionary length: {len(self.moves_dict)}\n\n")
-                        with open(f'checkers_table{self.depth}.pkl', 'wb') as handle:
-                            pickle.dump(self.moves_dict, handle, protocol=pickle.HIGHEST_PROTOCOL)
-                    else:
-                        with open(f'checkers_table{self.depth}.pkl', 'wb') as handle:
-                            pickle.dump(self.moves_dict, handle, protocol=pickle.HIGHEST_PROTOCOL)
-                    self.moves_dict = {}
-                    break
-                except pickle.UnpicklingError:
-                    print("Error saving moves dictionary")
-                except EOFError:
-                    print("Error saving moves dictionary")
+        """
+        Writes the results found since the last save to the move store. Only the new
+        results are written, so this costs the same however big the store gets. The
+        results held in memory are kept.
+        """
+        if self.use_dict == True and self.move_store is not None:
+            self.move_store.flush()
              
     def load_moves_dict(self, filename = None):
+        """
+        Opens the move store the teacher's results are kept in, checkers_moves.db unless
+        another filename is given. Results are looked up one at a time as they are needed,
+        so nothing is read here. Stores are kept per depth within the one file. Reloading
+        the same file keeps the results held in memory. The shared memory table, if the
+        teacher has one, is opened here too, and is used even without a move store.
+        """
         if self.use_dict == True:
-            while True:
-                try:
-                    # Load data (deserialize)
-                    if filename is None:
-                        if os.path.isfile(f'checkers_table{self.depth}.pkl'):
-                            with open(f'checkers_table{self.depth}.pkl', 'rb') as handle:
-                                self.moves_dict = pickle.load(handle)
-                    else:
-                        if os.path.isfile(filename):
-                            with open(filename, 'rb') as handle:
-                                self.moves_dict = pickle.load(handle)
-                    break
-                except pickle.UnpicklingError:
-                    print("Error loading moves dictionary")
-                except EOFError:
-                    print("Error loading moves dictionary")
+            path = DEFAULT_PATH if filename is None else filename
+            if self.move_store is None or self.move_store.path != path:
+                if self.move_store is not None:
+                    self.move_store.close()
+                self.move_store = MoveStore(path)
+                self.move_cache = None
+        if self.shared_cache_name is not None:
+            if self.shared_cache is None:
+                self.shared_cache = SharedMoveCache(self.move_store, self.shared_cache_name)
+            self.shared_cache.store = self.move_store
+        if self.move_cache is None and (self.move_store is not None or self.shared_cache is not None):
+            self.move_cache = MoveCache(self.shared_cache or self.move_store, self.cache_entries)
 
-    def alpha_beta(self, board_key, depth, alpha, beta, maximizing_player):
+    def alpha_beta(self, board_key, depth, alpha, beta, maximizing_player, possible_moves=None):
         """
         A method implementing alpha-beta pruning to decide what move to make given 
-        the current board configuration. 
+        the current board configuration. board_key is the decimal key of the board to
+        search from, and maximizing_player is True if player 1 is to move there. Values are
+        from player 1's point of view. The board is built once and searched with negamax.
+        possible_moves can be given when the root moves are already known, e.g. the moves
+        cached by the Game.
         """
-        # make new board
-        board = Board(self.p_tokens, self.dimensions, board_key, self.draw_counter, maximizing_player)
+        board = Board(self.p_tokens, self.dimensions, board_key, self.draw_counter, maximizing_player, self.use_bitboard)
+        if possible_moves is None:
+            # The root is always given its moves, so it is searched for a move rather than
+            # looked up in the tablebase
+            possible_moves = board.get_possible_next_moves()
+        search = self.negamax
+        if self.workers > 1 and depth > 1 and self.deadline is None:
+            search = self.root_split
+        if maximizing_player:
+            value, move = search(board, depth, alpha, beta, possible_moves)
+            return value, move
+        value, move = search(board, depth, -beta, -alpha, possible_moves)
+        return -value, move
 
-        if self.use_dict == True:
-            if board_key in self.moves_dict:
-                move = self.moves_dict[board_key]
-    #            with open(f'{self.agent_id}{self.depth}teachinfo.txt', 'a') as f:
-    #                f.write(f"Returning saved move {move} for board ({board_key})\n")
-                return move
+    def negamax(self, board, depth, alpha, beta, possible_moves=None):
+        """
+        Searches the given board with negamax alpha-beta, making and taking back each move
+        on the board itself, which is left as it was found. Values are from the point of
+        view of the player to move. Results are stored in the transposition table, and a
+        stored result is only used if it was searched at least as deep and, when it is a
+        bound, the bound alone is enough to cut the node off. Below the root (where
+        possible_moves is None), positions in the tablebase are given their exact value
+        without searching. Returns (value, best move).
+        """
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        tt_key = get_canonical_key(board.zobrist_key, board.flipped_key, board.player_turn)
+        entry = self.transposition_table.probe(tt_key)
+        tt_move = None
+        if entry is not None:
+            tt_move = self.get_entry_move(board, entry)
+            if entry[1] >= depth:
+                value, flag = entry[2], entry[3]
+                if flag == EXACT or (flag == LOWER_BOUND and value >= beta) or (flag == UPPER_BOUND and value <= alpha):
+                    return value, tt_move
+        original_alpha = alpha
 
         self.tested_states += 1
 
         if board.get_outcome() != 0:
-            if board.get_number_of_pieces_and_kings(board.player_turn) == [0,0]:
-                if maximizing_player:
-                    #Using integers instead of float("inf") so it's less than float("inf") not equal to
-                    return -10000000, None
-                else:
-                    return 10000000, None
-            elif board.get_number_of_pieces_and_kings(not board.player_turn) == [0,0]:
-                if maximizing_player:
-                    return 1000000, None
-                else:
-                    return -1000000, None
+            if board.has_no_pieces(board.player_turn):
+                #Using integers instead of float("inf") so it's less than float("inf") not equal to
+                return -10000000, None
+            elif board.has_no_pieces(not board.player_turn):
+                return 1000000, None
             else:
                 return 0, None
 
+        if (self.tablebase is not None and possible_moves is None
+                and sum(board.piece_counter) <= self.tablebase.max_pieces):
+            state = board.bitboard.get_state() if board.bitboard is not None else BitBoard.from_spots(board.spots).get_state()
+            self.tablebase_hits += 1
+            return get_value(self.tablebase.probe(*state, board.player_turn)), None
+
         if depth == 0:
-            players_info = board.get_number_of_pieces_and_kings()
-            if board.player_turn != maximizing_player:
-                reward = (players_info[1] + 2 * players_info[3]) - (players_info[0] + 2 * players_info[2])
-                return reward, None
+            players_info = board.piece_counter
             reward = (players_info[0] + 2 * players_info[2]) - (players_info[1] + 2 * players_info[3])
-            return reward, None
-        possible_moves = board.get_possible_next_moves()
-        potential_spots = board.get_potential_spots_from_moves(possible_moves)
+            return (reward if board.player_turn else -reward), None
+        if possible_moves is None:
+            possible_moves = board.get_possible_next_moves()
 
-        # Tests to see if draw counter increases
-        if len(potential_spots) == 1:
-            test_key = str(board.get_state_key(potential_spots[0]))
-            str_board_key = str(board_key)
-            if str_board_key.count('1') == test_key.count('1') and str_board_key.count('2') == test_key.count('2') and str_board_key.count('3') == test_key.count('3') and str_board_key.count('4') == test_key.count('4'):
-                self.draw_counter += 1
+        if self.use_move_ordering and len(possible_moves) > 1:
+            possible_moves = self.order_moves(board, possible_moves, depth, tt_move)
 
         desired_move_index = None
-        if maximizing_player:
-            v = float('-inf')
-            for j in range(len(potential_spots)):
-                new_key = board.get_state_key(potential_spots[j])
-                alpha_beta_results = self.alpha_beta(new_key, depth - 1, alpha, beta, False)
-                if v < alpha_beta_results[0]: 
-                    v = alpha_beta_results[0]
-                    alpha = max(alpha, v)
-                    desired_move_index = j
-                if beta <= alpha: 
-                    break
-            if desired_move_index is None:
-                return v, None
-            
-            return v, possible_moves[desired_move_index]
+        v = float('-inf')
+        for j in range(len(possible_moves)):
+            record = board.make_move(possible_moves[j])
+            child_value = -self.negamax(board, depth - 1, -beta, -alpha)[0]
+            board.unmake_move(record)
+            if v < child_value:
+                v = child_value
+                alpha = max(alpha, v)
+                desired_move_index = j
+            if beta <= alpha:
+                self.record_cutoff(possible_moves[j], j, depth)
+                break
+
+        flag = self.transposition_table.get_bound(v, original_alpha, beta)
+        if desired_move_index is None or flag == UPPER_BOUND:
+            # No move reached the window, so none of them is known to be best
+            best_move = None
         else:
-            v = float('inf')
-            for j in range(len(potential_spots)):
-                new_key = board.get_state_key(potential_spots[j])
-                alpha_beta_results = self.alpha_beta(new_key, depth - 1, alpha, beta, True)
-                if v > alpha_beta_results[0]:  
-                    v = alpha_beta_results[0]
-                    desired_move_index = j
-                    beta = min(beta, v)
+            best_move = possible_moves[desired_move_index]
+        self.store_entry(board, tt_key, depth, v, flag, best_move)
+        if desired_move_index is None:
+            return v, None
+        
+        return v, possible_moves[desired_move_index]
+
+    def root_split(self, board, depth, alpha, beta, possible_moves=None):
+        """
+        Searches the root like negamax, but with the root moves split over the worker
+        processes. The first move is searched here so the others start with its value as a
+        bound (young brothers wait). Then the rest are searched in parallel, each starting
+        from the best value found so far. A move earlier in the order than the move that
+        value came from is searched with a bound one lower, so a tie still goes to the
+        earlier move and the same move is chosen as by negamax on the same positions.
+        """
+        tt_key = get_canonical_key(board.zobrist_key, board.flipped_key, board.player_turn)
+        entry = self.transposition_table.probe(tt_key)
+        tt_move = None
+        if entry is not None:
+            tt_move = self.get_entry_move(board, entry)
+            if entry[1] >= depth and entry[3] == EXACT:
+                return entry[2], tt_move
+        if possible_moves is None:
+            possible_moves = board.get_possible_next_moves()
+        if len(possible_moves) < 2 or board.get_outcome() != 0:
+            return self.negamax(board, depth, alpha, beta, possible_moves)
+        if self.use_move_ordering:
+            possible_moves = self.order_moves(board, possible_moves, depth, tt_move)
+        original_alpha = alpha
+
+        self.tested_states += 1
+        record = board.make_move(possible_moves[0])
+        v = -self.negamax(board, depth - 1, -beta, -alpha)[0]
+        board.unmake_move(record)
+        desired_move_index = 0
+        alpha = max(alpha, v)
+        if beta <= alpha:
+            self.record_cutoff(possible_moves[0], 0, depth)
+            return v, possible_moves[0]
+
+        if self.executor is None:
+            self.shared_alpha = multiprocessing.Array('d', [alpha, 0])
+            settings = {'use_bitboard': self.use_bitboard, 'use_move_ordering': self.use_move_ordering,
+                        'tt_size_bits': self.transposition_table.size.bit_length() - 1,
+                        'tablebase_path': self.tablebase_path}
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                initargs=(settings, self.shared_alpha))
+        with self.shared_alpha.get_lock():
+            self.shared_alpha[0] = alpha
+            self.shared_alpha[1] = 0
+        board_key = board.get_state_key(board.spots)
+        futures = {}
+        for j in range(1, len(possible_moves)):
+            future = self.executor.submit(_search_root_move, self.p_tokens, self.dimensions, board_key,
+                                          board.player_turn, possible_moves[j], j, depth, alpha, beta)
+            futures[future] = j
+
+        for future in as_completed(futures):
+            j = futures[future]
+            child_value, child_alpha, nodes, cutoffs, first_move_cutoffs = future.result()
+            self.tested_states += nodes
+            self.cutoffs += cutoffs
+            self.first_move_cutoffs += first_move_cutoffs
+            # A value at or below the bound the move was searched with is only an upper bound
+            if child_value > child_alpha and (child_value > v or (child_value == v and j < desired_move_index)):
+                v = child_value
+                desired_move_index = j
+                alpha = max(alpha, v)
+                with self.shared_alpha.get_lock():
+                    self.shared_alpha[0] = v
+                    self.shared_alpha[1] = j
                 if beta <= alpha:
+                    self.record_cutoff(possible_moves[j], j, depth)
+                    for other in futures:
+                        other.cancel()
                     break
-            if desired_move_index is None:
-                return v, None
-            
-            return v, possible_moves[desired_move_index]
+
+        flag = self.transposition_table.get_bound(v, original_alpha, beta)
+        best_move = None if flag == UPPER_BOUND else possible_moves[desired_move_index]
+        self.store_entry(board, tt_key, depth, v, flag, best_move)
+        return v, possible_moves[desired_move_index]
+
+    def close(self):
+        """
+        Shuts down the worker processes, if any were started, and writes and closes the
+        move store.
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        if self.ponder_executor is not None:
+            self.ponder_executor.shutdown(cancel_futures=True)
+            self.ponder_executor = None
+            self.ponder_futures = {}
+        if self.move_store is not None:
+            self.move_store.close()
+            self.move_store = None
+            self.move_cache = None
+        if self.shared_cache is not None:
+            self.shared_cache.close()
+            self.shared_cache = None
+            self.move_cache = None
+
+    def start_pondering(self, board, replies):
+        """
+        Starts searching, in a background process, the positions after the first
+        MAX_PONDER_REPLIES of the given replies, to the current depth, so the search is
+        already done if the agent plays one of them. board is the Game, with the agent to
+        move. Searches started for earlier moves are dropped. Nothing is searched when the
+        teacher's next move will be random, which is decided here rather than in choose_move.
+        """
+        if not self.pondering or self.time_budget_ms is not None:
+            return
+        for future in self.ponder_futures.values():
+            future.cancel()
+        self.ponder_futures = {}
+        self.next_roll = random.random()
+        if self.next_roll > self.level:
+            return
+        if self.ponder_executor is None:
+            settings = {'use_bitboard': self.use_bitboard, 'use_move_ordering': self.use_move_ordering,
+                        'tt_size_bits': self.transposition_table.size.bit_length() - 1,
+                        'tablebase_path': self.tablebase_path}
+            self.ponder_executor = ProcessPoolExecutor(max_workers=1, initializer=_init_worker,
+                                                       initargs=(settings, None))
+        for reply in replies[:self.MAX_PONDER_REPLIES]:
+            record = board.make_move(reply)
+            key = (board.get_state_key(), self.depth)
+            if key not in self.ponder_futures and board.get_possible_next_moves():
+                self.ponder_futures[key] = self.ponder_executor.submit(
+                    _ponder_position, self.p_tokens, self.dimensions, board.get_decimal_key(),
+                    board.player_turn, self.depth)
+            board.unmake_move(record)
+
+    def get_pondered(self, possible_actions):
+        """
+        Gets the (value, move) of a search start_pondering started for the current board
+        and depth, waiting for it if it is still running, or None if there was none.
+        Every other search started by start_pondering is dropped.
+        """
+        future = self.ponder_futures.pop((self.board_key, self.depth), None)
+        for other in self.ponder_futures.values():
+            other.cancel()
+        self.ponder_futures = {}
+        if future is None or future.cancelled():
+            return None
+        value, move = future.result()
+        if move not in possible_actions:
+            return None
+        return value, move
+
+    def get_cache_stats(self):
+        """
+        Gets the hit, miss and eviction counts of the in-memory move cache (see
+        MoveCache.get_stats), or None if no move store is open. With a shared memory
+        table, its counts are added with a shared_ prefix.
+        """
+        if self.move_cache is None:
+            return None
+        stats = self.move_cache.get_stats()
+        if self.shared_cache is not None:
+            stats.update({f'shared_{name}': value for name, value in self.shared_cache.get_stats().items()})
+        return stats
+
+    def get_entry_move(self, board, entry):
+        """
+        Gets the best move of a transposition table entry as a move on the given board.
+        Entries are kept with player 1 to move (see zobrist.get_canonical_key), so with
+        player 2 to move the stored move is on the flipped board.
+        """
+        move = entry[4]
+        if move is None or board.player_turn:
+            return move
+        return flip_move(move)
+
+    def store_entry(self, board, tt_key, depth, value, flag, move):
+        """
+        Stores a search result of the given board in the transposition table, with the
+        move flipped when player 2 is to move, as get_entry_move expects.
+        """
+        if move is not None and not board.player_turn:
+            move = flip_move(move)
+        self.transposition_table.store(tt_key, depth, value, flag, move)
+
+    def order_moves(self, board, possible_moves, depth, tt_move):
+        """
+        Gets the moves sorted so the ones most likely to cause a cutoff come first: the
+        transposition table's best move, then captures (longest first), then promotions,
+        then this depth's killer moves, then by history score. Ties keep the Board's order.
+        """
+        killers = self.killers.get(depth, ())
+        history = self.history
+        scores = {}
+        for move in possible_moves:
+            if move == tt_move:
+                score = self.TT_MOVE_SCORE
+            else:
+                score = self.CAPTURE_SCORE * get_jump_count(move)
+                start = get_start_square(move)
+                piece = board.spots[start // board.WIDTH][start % board.WIDTH]
+                end_row = get_end_square(move) // board.WIDTH
+                if (piece == board.P1 and end_row == board.HEIGHT - 1) or (piece == board.P2 and end_row == 0):
+                    score += self.PROMOTION_SCORE
+                if move in killers:
+                    score += self.KILLER_SCORE * (2 if move == killers[0] else 1)
+                score += min(history.get(move, 0), self.KILLER_SCORE - 1)
+            scores[move] = score
+        return sorted(possible_moves, key=lambda move: -scores[move])
+
+    def record_cutoff(self, move, move_index, depth):
+        """
+        Updates the cutoff statistics, killer moves and history scores for a move which
+        caused a cutoff.
+        """
+        self.cutoffs += 1
+        if move_index == 0:
+            self.first_move_cutoffs += 1
+        if get_jump_count(move) == 0:
+            killers = self.killers.get(depth, ())
+            if not killers or killers[0] != move:
+                self.killers[depth] = (move,) + killers[:1]
+        self.history[move] = self.history.get(move, 0) + depth * depth
+
+    def get_search_stats(self):
+        """
+        Gets the node and cutoff counts of the last search. first_move_rate is the share
+        of cutoffs that came from the first move searched, which is high when the moves
+        are well ordered. seconds, nodes_per_sec and source are for the whole of the last
+        get_next_move. Worker processes' transposition tables are not counted.
+        """
+        transposition_table = self.transposition_table
+        return {
+            'source': self.move_source,
+            'seconds': self.search_time,
+            'nodes': self.tested_states,
+            'nodes_per_sec': self.tested_states / self.search_time if self.search_time > 0 else 0.0,
+            'cutoffs': self.cutoffs,
+            'first_move_cutoffs': self.first_move_cutoffs,
+            'first_move_rate': self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0,
+            'completed_depth': self.completed_depth,
+            'tablebase_hits': self.tablebase_hits,
+            'tt_probes': transposition_table.probes - self.tt_probes,
+            'tt_hits': transposition_table.hits - self.tt_hits,
+        }
+
+    def iterative_deepening(self, possible_actions):
+        """
+        Searches to depth 1, 2, 3, ... until time_budget_ms runs out and returns the best
+        move of the deepest search that finished. Each search tries the best move of the
+        search before it first. The depth 1 search is always finished, whatever the budget.
+        """
+        start_time = time.perf_counter()
+        ordered_actions = list(possible_actions)
+        selected_move = ordered_actions[0]
+        self.completed_depth = 0
+        try:
+            for depth in range(1, self.MAX_ITERATIVE_DEPTH + 1):
+                value, move = self.alpha_beta(self.decimal_key, depth, float('-inf'), float('inf'), self.player_id, ordered_actions)
+                self.completed_depth = depth
+                if move is not None:
+                    selected_move = move
+                    ordered_actions.remove(move)
+                    ordered_actions.insert(0, move)
+                # A won or lost position will not change with a deeper search
+                if abs(value) >= DECIDED_VALUE:
+                    break
+                self.deadline = start_time + self.time_budget_ms / 1000
+                if time.perf_counter() > self.deadline:
+                    break
+        except SearchTimeout:
+            pass
+        finally:
+            self.deadline = None
+        return selected_move
     
-    def get_next_move(self):
+    def new_search(self):
+        """
+        Resets the statistics and killer moves for a new search, and halves the history
+        scores so recent searches count for more.
+        """
         self.tested_states = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.completed_depth = 0
+        self.tablebase_hits = 0
+        self.tt_probes = self.transposition_table.probes
+        self.tt_hits = self.transposition_table.hits
+        self.search_start = time.perf_counter()
+        self.killers = {}
+        self.history = {move: score // 2 for move, score in self.history.items() if score > 1}
+        self.transposition_table.new_search()
+
+    def get_next_move(self):
+        """
+        Chooses a move for the current board, and adds the statistics of choosing it to
+        self.search_stats.
+        """
+        self.new_search()
+        selected_move = self.choose_move()
+        self.search_time = time.perf_counter() - self.search_start
+        self.search_stats.add(self.get_search_stats())
+        return selected_move
 
+    def choose_move(self):
+        """
+        Chooses a move for the current board: a random one with probability 1 - level,
+        otherwise from the opening book, the move store or a search, and records which
+        in self.move_source.
+        """
         possible_actions = self.board.get_possible_next_moves()
 
         # Chose randomly with some probability so that the teacher does not always win
-        if random.random() > self.level:
+        roll = self.next_roll if self.next_roll is not None else random.random()
+        self.next_roll = None
+        if roll > self.level:
+            self.move_source = 'random'
             if possible_actions == []:
                 return None
             else:
@@ -211,35 +612,58 @@ class Alpha_beta(Teacher):
             
         # Does not test if there is only one possible action
         if len(possible_actions) == 1:
+            self.move_source = 'forced'
             return possible_actions[0]
-        
-        if self.use_dict == True:
+
+        if self.book is not None:
+            book_entry = self.book.probe(get_side_key(self.board_key, self.player_id))
+            # The move is checked in case another position has the same key
+            if book_entry is not None and book_entry[0] in possible_actions:
+                self.book_hits += 1
+                self.move_source = 'book'
+                return book_entry[0]
+
+        self.move_source = 'search'
+        if self.time_budget_ms is not None:
+            selected_move = self.iterative_deepening(possible_actions)
+        elif self.use_dict == True or self.shared_cache_name is not None:
+            if self.move_cache is None:
+                self.load_moves_dict()
+            stored_results = self.move_cache.get(self.depth, self.board_key)
             # If the board configuration has not been seen before, use alpha-beta to decide the next move
-            if self.board_key not in self.moves_dict:
-                alpha_beta_results = self.alpha_beta(self.board_key, self.depth, float('-inf'), float('inf'), self.player_id)
-    #            with open(f'{self.agent_id}{self.depth}teachinfo.txt', 'a') as f:
-    #                f.write(f"Genning new move\n")
-                self.moves_dict[self.board_key] = alpha_beta_results
+            if stored_results is None:
+                alpha_beta_results = self.search_root(possible_actions)
+                self.move_cache.put(self.depth, self.board_key, alpha_beta_results[0], alpha_beta_results[1])
+                self.completed_depth = self.depth
                 selected_move = alpha_beta_results[1] 
             else:
-    #            with open(f'{self.agent_id}{self.depth}teachinfo.txt', 'a') as f:
-    #                f.write(f"Finding old move\n")
-                selected_move = self.moves_dict[self.board_key][1]
-    #        with open(f'{self.agent_id}{self.depth}teachinfo.txt', 'a') as f:
-    #            f.write(f"Teacher returning move {selected_move} for board ({self.board_key})\n")
-    #            f.write(f"Total teaching time: {self.teach_time}. Tested states: {self.tested_states}\n\n")
+                self.move_source = 'store'
+                selected_move = stored_results[1]
         else:
-            alpha_beta_results = self.alpha_beta(self.board_key, self.depth, float('-inf'), float('inf'), self.player_id)
+            alpha_beta_results = self.search_root(possible_actions)
+            self.completed_depth = self.depth
             selected_move = alpha_beta_results[1]
         
         return selected_move
+
+    def search_root(self, possible_actions):
+        """
+        Gets the (value, move) of the current board searched to self.depth, from a search
+        started by start_pondering if there is one.
+        """
+        if self.ponder_futures:
+            pondered = self.get_pondered(possible_actions)
+            if pondered is not None:
+                self.move_source = 'ponder'
+                return pondered
+        return self.alpha_beta(self.decimal_key, self.depth, float('-inf'), float('inf'), self.player_id, possible_actions)
  
 
 class Board:
     """
     Creates a lightweight board object to be used by the teacher.
     """
-    def __init__(self, player_tokens, dimensions, board_key, draw_counter, player_turn):
+    def __init__(self, player_tokens, dimensions, board_key, draw_counter, player_turn, use_bitboard=True):
         self.player_tokens = player_tokens
         self.dimensions = dimensions
         self.P1 = player_tokens[0]
@@ -254,6 +678,11 @@ class Board:
         self.spots = self.get_spots(board_key)
         self.player_turn = player_turn
         self.draw_counter = draw_counter
+        self.bitboard = BitBoard.from_spots(self.spots) if use_bitboard else None
+        self.zobrist_key = hash_spots(self.spots)
+        # The key of the board turned half a turn with the colours swapped (see zobrist.py)
+        self.flipped_key = hash_flipped_spots(self.spots)
+        self.piece_counter = self.count_pieces_and_kings()
 
         
     def get_state_key(self, spots):
@@ -268,6 +697,15 @@ class Board:
         answer = answer // 10
         return answer
 
+    def get_state_key_after_move(self, move):
+        """
+        Gets the state key the board would have after the given move, without keeping the move.
+        """
+        record = self.make_move(move, switch_player_turn=False)
+        answer = self.get_state_key(self.spots)
+        self.unmake_move(record)
+        return answer
+
     def get_spots(self, board_key):
         """
         Gets the board spots from a given board_key.
@@ -292,7 +730,7 @@ class Board:
         2: Player 2 wins
         3: Game is a tie (NOT IMPLEMENTED IN MINMAX YET)
         """
-        piece_counter = self.get_number_of_pieces_and_kings()
+        piece_counter = self.piece_counter
         if piece_counter[0] != 0 or piece_counter[2] != 0:
             if piece_counter[1] != 0 or piece_counter[3] != 0:
                 return 0
@@ -315,17 +753,34 @@ class Board:
         [P1_pieces, P2_pieces, P1_kings, P2_kings]
         and if given a player_id:
         [player_pieces, player_kings]
+        The counts are kept up to date by make_move.
         """
-        piece_counter = [0,0,0,0]  
-        for row in self.spots:
-            for element in row:
-                if element != 0:
-                    piece_counter[element-1] = piece_counter[element-1] + 1
+        piece_counter = self.piece_counter
         if player_id is not None:
             if player_id == True:
                 return [piece_counter[0], piece_counter[2]]
             return [piece_counter[1], piece_counter[3]]
         
+        return piece_counter[:]
+
+    def has_no_pieces(self, player_id):
+        """
+        Finds out if the given player has no pieces or kings left.
+        """
+        if player_id == True:
+            return self.piece_counter[0] == 0 and self.piece_counter[2] == 0
+        return self.piece_counter[1] == 0 and self.piece_counter[3] == 0
+
+    def count_pieces_and_kings(self):
+        """
+        Counts the pieces and kings on the board from scratch, in the default format of
+        get_number_of_pieces_and_kings.
+        """
+        piece_counter = [0,0,0,0]  
+        for row in self.spots:
+            for element in row:
+                if element != 0:
+                    piece_counter[element-1] = piece_counter[element-1] + 1
         return piece_counter
     
     def not_spot(self, loc):
@@ -383,23 +838,16 @@ class Board:
         PRE-CONDITION:
         -start_loc is a location with a players piece
         """
-        if self.spots[start_loc[0]][start_loc[1]] > 2:
-            next_locations = self.forward_n_locations(start_loc, 1)
-            next_locations.extend(self.forward_n_locations(start_loc, 1, True))
-        elif self.spots[start_loc[0]][start_loc[1]] == self.BACKWARDS_PLAYER:
-            next_locations = self.forward_n_locations(start_loc, 1, True)  # Switched the true from the statement below
-        else:
-            next_locations = self.forward_n_locations(start_loc, 1)
-        
-
-        possible_next_locations = []
+        piece = self.spots[start_loc[0]][start_loc[1]]
+        neighbours = NEIGHBOUR_TABLE[start_loc[0]][start_loc[1]]
 
-        for location in next_locations:
-            if len(location) != 0:
-                if self.spots[location[0]][location[1]] == self.EMPTY_SPOT:
-                    possible_next_locations.append(location)
+        answer = []
+        for direction in PIECE_DIRECTIONS[piece]:
+            step = neighbours[direction][0]
+            if step is not None and self.spots[step[0]][step[1]] == self.EMPTY_SPOT:
+                answer.append([start_loc, step])
             
-        return [[start_loc, end_spot] for end_spot in possible_next_locations]      
+        return answer      
            
     def get_capture_moves(self, start_loc, move_beginnings=None):
         """
@@ -409,36 +857,26 @@ class Board:
             move_beginnings = [start_loc]
             
         answer = []
-        if self.spots[start_loc[0]][start_loc[1]] > 2:  
-            next1 = self.forward_n_locations(start_loc, 1)
-            next2 = self.forward_n_locations(start_loc, 2)
-            next1.extend(self.forward_n_locations(start_loc, 1, True))
-            next2.extend(self.forward_n_locations(start_loc, 2, True))
-        elif self.spots[start_loc[0]][start_loc[1]] == self.BACKWARDS_PLAYER:
-            next1 = self.forward_n_locations(start_loc, 1, True)
-            next2 = self.forward_n_locations(start_loc, 2, True)
-        else:
-            next1 = self.forward_n_locations(start_loc, 1)
-            next2 = self.forward_n_locations(start_loc, 2)
-        
-        
-        for j in range(len(next1)):
-            if (not self.not_spot(next2[j])) and (not self.not_spot(next1[j])) :  # if both spots exist
-                if self.get_spot_info(next1[j]) != self.EMPTY_SPOT and self.get_spot_info(next1[j]) % 2 != self.get_spot_info(start_loc) % 2:  # if next spot is opponent
-                    if self.get_spot_info(next2[j]) == self.EMPTY_SPOT:  # if next next spot is empty
-                        temp_move1 = copy.deepcopy(move_beginnings)
-                        temp_move1.append(next2[j])
+        piece = self.spots[start_loc[0]][start_loc[1]]
+        neighbours = NEIGHBOUR_TABLE[start_loc[0]][start_loc[1]]
+
+        for direction in PIECE_DIRECTIONS[piece]:
+            step, jumped, landing = neighbours[direction]
+            if landing is not None:  # if both spots exist
+                jumped_piece = self.spots[jumped[0]][jumped[1]]
+                if jumped_piece != self.EMPTY_SPOT and jumped_piece % 2 != piece % 2:  # if next spot is opponent
+                    if self.spots[landing[0]][landing[1]] == self.EMPTY_SPOT:  # if next next spot is empty
+                        temp_move1 = move_beginnings + [landing]
                         
                         answer_length = len(answer)
                         
-                        if self.get_spot_info(start_loc) != self.P1 or next2[j][0] != self.HEIGHT - 1: 
-                            if self.get_spot_info(start_loc) != self.P2 or next2[j][0] != 0: 
-
-                                temp_move2 = [start_loc, next2[j]]
-                                temp_board = Board(self.player_tokens, self.dimensions, copy.deepcopy(self.board_key), self.draw_counter, self.player_turn)
-                                temp_board.make_move(temp_move2, False)
+                        if piece != self.P1 or landing[0] != self.HEIGHT - 1: 
+                            if piece != self.P2 or landing[0] != 0: 
 
-                                answer.extend(temp_board.get_capture_moves(temp_move2[1], temp_move1))
+                                # Follow the jump on this board and take it back afterwards
+                                record = self.make_move([start_loc, landing], False)
+                                answer.extend(self.get_capture_moves(landing, temp_move1))
+                                self.unmake_move(record)
                                 
                         if len(answer) == answer_length:
                             answer.append(temp_move1)
@@ -447,8 +885,11 @@ class Board:
     
     def get_possible_next_moves(self):
         """
-        Gets the possible moves that can be made from the current board configuration.
+        Gets the possible moves that can be made from the current board configuration, as
+        move codes (see moves.py).
         """
+        if self.bitboard is not None:
+            return self.bitboard.get_possible_next_moves(self.player_turn)
         piece_locations = []
         for j in range(self.HEIGHT):
             for i in range(self.WIDTH):
@@ -458,15 +899,11 @@ class Board:
             capture_moves = list(reduce(lambda a, b: a + b, list(map(self.get_capture_moves, piece_locations))))  # CHECK IF OUTER LIST IS NECESSARY
 
             if len(capture_moves) != 0:
-                for x in capture_moves:
-                    x = tuple([tuple(x[0]), tuple(x[1])])
-                return capture_moves
+                return [encode_move(x) for x in capture_moves]
 
             
             basic_moves = list(reduce(lambda a, b: a + b, list(map(self.get_simple_moves, piece_locations))))  # CHECK IF OUTER LIST IS NECESSARY
-            for x in basic_moves:
-                x = tuple([tuple(x[0]), tuple(x[1])])
-            return basic_moves
+            return [encode_move(x) for x in basic_moves]
         except TypeError:
             return []
     
@@ -479,17 +916,25 @@ class Board:
             return self.spots
         answer = []
         for move in moves:
-            original_spots = copy.deepcopy(self.spots)
-            self.make_move(move, switch_player_turn=False)
-            answer.append(self.spots) 
-            self.spots = original_spots 
+            record = self.make_move(move, switch_player_turn=False)
+            answer.append([row[:] for row in self.spots])
+            self.unmake_move(record)
         return answer
         
     def make_move(self, move, switch_player_turn=True):
         """
         Makes a given move on the board, and (as long as is wanted) switches the indicator for
-        which players turn it is.
+        which players turn it is.  The move is a move code (see moves.py) or a list of
+        [row, col] locations.  Returns a record of what the move captured and promoted
+        which can be given to unmake_move to take the move back.
         """
+        if not isinstance(move, int):
+            move = encode_move(move)
+        code = move
+        move = decode_move(code)
+        captured = []
+        original_key = self.zobrist_key
+        original_flipped_key = self.flipped_key
         if abs(move[0][0] - move[1][0]) == 2:
             for j in range(len(move) - 1):
                 if move[j][0] % 2 == 1:
@@ -503,17 +948,102 @@ class Board:
                     else:
                         middle_y = move[j][1]
                         
-                self.spots[int((move[j][0] + move[j + 1][0]) / 2)][middle_y] = self.EMPTY_SPOT
+                middle_x = (move[j][0] + move[j + 1][0]) // 2
+                captured.append((middle_x, middle_y, self.spots[middle_x][middle_y]))
+                self.piece_counter[self.spots[middle_x][middle_y] - 1] -= 1
+                self.zobrist_key ^= PIECE_KEYS[self.spots[middle_x][middle_y]][middle_x * self.WIDTH + middle_y]
+                self.flipped_key ^= FLIPPED_KEYS[self.spots[middle_x][middle_y]][middle_x * self.WIDTH + middle_y]
+                self.spots[middle_x][middle_y] = self.EMPTY_SPOT
                 
-                
-        self.spots[move[len(move) - 1][0]][move[len(move) - 1][1]] = self.spots[move[0][0]][move[0][1]]
-        if move[len(move) - 1][0] == self.HEIGHT - 1 and self.spots[move[len(move) - 1][0]][move[len(move) - 1][1]] == self.P1:
-            self.spots[move[len(move) - 1][0]][move[len(move) - 1][1]] = self.P1_K
-        elif move[len(move) - 1][0] == 0 and self.spots[move[len(move) - 1][0]][move[len(move) - 1][1]] == self.P2:
-            self.spots[move[len(move) - 1][0]][move[len(move) - 1][1]] = self.P2_K
-        else:
-            self.spots[move[len(move) - 1][0]][move[len(move) - 1][1]] = self.spots[move[0][0]][move[0][1]]
+        # Lift the piece first so a king whose jumps end where they started is not lost
+        end = move[len(move) - 1]
+        piece = self.spots[move[0][0]][move[0][1]]
         self.spots[move[0][0]][move[0][1]] = self.EMPTY_SPOT
+        self.spots[end[0]][end[1]] = piece
+        promoted = False
+        if end[0] == self.HEIGHT - 1 and piece == self.P1:
+            self.spots[end[0]][end[1]] = self.P1_K
+            promoted = True
+        elif end[0] == 0 and piece == self.P2:
+            self.spots[end[0]][end[1]] = self.P2_K
+            promoted = True
+        if promoted:
+            self.piece_counter[piece - 1] -= 1
+            self.piece_counter[self.spots[end[0]][end[1]] - 1] += 1
+        self.zobrist_key ^= PIECE_KEYS[piece][move[0][0] * self.WIDTH + move[0][1]]
+        self.zobrist_key ^= PIECE_KEYS[self.spots[end[0]][end[1]]][end[0] * self.WIDTH + end[1]]
+        self.flipped_key ^= FLIPPED_KEYS[piece][move[0][0] * self.WIDTH + move[0][1]]
+        self.flipped_key ^= FLIPPED_KEYS[self.spots[end[0]][end[1]]][end[0] * self.WIDTH + end[1]]
+
+        original_bits = None
+        if self.bitboard is not None:
+            original_bits = self.bitboard.get_state()
+            self.bitboard.make_move(code)
                 
         if switch_player_turn:
-            self.player_turn = not self.player_turn
\ No newline at end of file
+            self.player_turn = not self.player_turn
+
+        return (move, piece, captured, promoted, switch_player_turn, original_bits, original_key, original_flipped_key)
+
+    def unmake_move(self, record):
+        """
+        Takes back a move using the record returned by make_move.  Moves must be taken
+        back in the reverse of the order they were made.
+        """
+        move, piece, captured, promoted, switched_player_turn, original_bits, original_key, original_flipped_key = record
+        if switched_player_turn:
+            self.player_turn = not self.player_turn
+        end = move[len(move) - 1]
+        if promoted:
+            self.piece_counter[piece - 1] += 1
+            self.piece_counter[self.spots[end[0]][end[1]] - 1] -= 1
+        self.spots[end[0]][end[1]] = self.EMPTY_SPOT
+        self.spots[move[0][0]][move[0][1]] = piece
+        for middle_x, middle_y, captured_piece in captured:
+            self.spots[middle_x][middle_y] = captured_piece
+            self.piece_counter[captured_piece - 1] += 1
+        self.zobrist_key = original_key
+        self.flipped_key = original_flipped_key
+        if original_bits is not None:
+            self.bitboard.set_state(original_bits)
+
+
+# The Alpha_beta each worker process searches with and the alpha shared with the main
+# process, set up once per worker by _init_worker
+_worker_teacher = None
+_worker_shared_alpha = None
+
+
+def _init_worker(settings, shared_alpha):
+    global _worker_teacher, _worker_shared_alpha
+    _worker_teacher = Alpha_beta(use_dict=False, **settings)
+    _worker_shared_alpha = shared_alpha
+
+
+def _ponder_position(p_tokens, dimensions, decimal_key, player_turn, depth):
+    """
+    Searches a position in a worker process for Alpha_beta.start_pondering and returns
+    (value, move), with the value from player 1's point of view.
+    """
+    teacher = _worker_teacher
+    teacher.new_search()
+    teacher.p_tokens = p_tokens
+    teacher.dimensions = dimensions
+    return teacher.alpha_beta(decimal_key, depth, float('-inf'), float('inf'), player_turn)
+
+
+def _search_root_move(p_tokens, dimensions, board_key, player_turn, move, move_index, depth, alpha, beta):
+    """
+    Searches one root move in a worker process for Alpha_beta.root_split. Returns the move's
+    value for the player to move at the root, the alpha it was searched with, and the
+    search statistics.
+    """
+    teacher = _worker_teacher
+    teacher.new_search()
+    with _worker_shared_alpha.get_lock():
+        shared_alpha, shared_index = _worker_shared_alpha[0], _worker_shared_alpha[1]
+    alpha = max(alpha, shared_alpha if move_index > shared_index else shared_alpha - 1)
+    board = Board(p_tokens, dimensions, board_key, 0, player_turn, teacher.use_bitboard)
+    board.make_move(move)
+    value = -teacher.negamax(board, depth - 1, -beta, -alpha)[0]
+    return value, alpha, teacher.tested_states, teacher.cutoffs, teacher.first_move_cutoffs
@@ -0,0 +1,87 @@
+"""
+NOTES:
+-Stores search results for the teacher's alpha-beta search, keyed by the Zobrist key of
+the board with the side to move xored in. Positions with player 2 to move are stored as
+the flipped board with player 1 to move, which plays the same (see
+zobrist.get_canonical_key), so both colours share entries. Their best moves are stored
+flipped too (see Alpha_beta.get_entry_move)
+-The table has a fixed number of slots, a power of two, and a key always goes to the slot
+given by its low bits, so it never grows past the size it was made with
+-Each slot holds (key, depth, value, flag, move, generation).  The flag says whether the
+value is exact or only a bound, because a search cut off by alpha or beta does not find
+the exact value of the position
+-Replacement: a new entry takes a slot if the slot is empty, holds the same position,
+was stored in an earlier search (an older generation) or was searched no deeper than
+the new entry
+"""
+
+
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+
+class TranspositionTable:
+    """
+    A fixed size table of alpha-beta search results.
+    """
+
+    def __init__(self, size_bits=20):
+        """
+        Makes a table with 2 ** size_bits slots.
+        """
+        self.size = 1 << size_bits
+        self.mask = self.size - 1
+        self.slots = [None] * self.size
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def new_search(self):
+        """
+        Marks the start of a new search, so entries from earlier searches are replaced first.
+        """
+        self.generation += 1
+
+    def clear(self):
+        """
+        Removes every entry.
+        """
+        self.slots = [None] * self.size
+
+    def probe(self, key):
+        """
+        Gets the (key, depth, value, flag, move, generation) entry for the given key, or
+        None if the table does not hold it.
+        """
+        self.probes += 1
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, value, flag, move):
+        """
+        Stores a search result if the replacement policy lets it take its slot.
+        """
+        index = key & self.mask
+        entry = self.slots[index]
+        if entry is not None and entry[0] != key:
+            if entry[5] == self.generation and entry[1] > depth:
+                return
+            self.overwrites += 1
+        self.slots[index] = (key, depth, value, flag, move, self.generation)
+        self.stores += 1
+
+    def get_bound(self, value, alpha, beta):
+        """
+        Gets the flag for a value found by searching with the given alpha and beta.
+        """
+        if value <= alpha:
+            return UPPER_BOUND
+        if value >= beta:
+            return LOWER_BOUND
+        return EXACT
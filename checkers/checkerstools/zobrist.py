@@ -0,0 +1,108 @@
+"""
+NOTES:
+-A state key is the xor of one 64 bit number per (piece, square) pair on the board,
+so making a move only needs the keys of the squares it changes
+-The numbers come from a fixed seed so keys are the same in every process and run,
+which is what lets Q-tables and teacher tables be pickled and shared
+-Squares are numbered row by row, square = row * 4 + col
+-The game looks the same to both players after turning the board half a turn and
+swapping the colours: square s goes to square 31 - s and each piece becomes the other
+player's piece of the same kind. A position with player 2 to move plays exactly like
+the flipped position with player 1 to move, so tables which hold positions for both
+sides can key them all as player 1 to move (see get_canonical_key). The flipped key is
+kept alongside the state key from FLIPPED_KEYS, so it is as cheap to update
+"""
+
+
+import random
+
+ZOBRIST_SEED = 20240417
+HEIGHT = 8
+WIDTH = 4
+NUM_SQUARES = HEIGHT * WIDTH
+
+
+def _make_piece_keys():
+    """
+    Builds the random number used for each piece token (1-4) on each square.
+    Token 0 (an empty spot) gets zeros so it never changes a key.
+    """
+    generator = random.Random(ZOBRIST_SEED)
+    keys = [[0] * NUM_SQUARES]
+    for piece in range(1, 5):
+        keys.append([generator.getrandbits(64) for _ in range(NUM_SQUARES)])
+    return keys
+
+
+PIECE_KEYS = _make_piece_keys()
+# The other player's piece of the same kind, for each token
+FLIPPED_PIECES = (0, 2, 1, 4, 3)
+# FLIPPED_KEYS[piece][square] is the key of the flipped piece on the flipped square, so
+# xoring these for every piece on the board gives the state key of the flipped board
+FLIPPED_KEYS = [[PIECE_KEYS[FLIPPED_PIECES[piece]][NUM_SQUARES - 1 - square] for square in range(NUM_SQUARES)]
+                for piece in range(5)]
+# Xored into a state key when it is player 1's turn, for tables that care who is to move.
+# It comes from its own generator so PIECE_KEYS stay the same as before it was added
+SIDE_KEY = random.Random(ZOBRIST_SEED + 1).getrandbits(64)
+
+
+def hash_spots(spots):
+    """
+    Computes the state key of a Game style list of 8 rows of 4 spots from scratch.
+    """
+    answer = 0
+    square = 0
+    for row in spots:
+        for element in row:
+            answer ^= PIECE_KEYS[element][square]
+            square += 1
+    return answer
+
+
+def hash_flipped_spots(spots):
+    """
+    Computes the state key of the flipped board (see the notes) of a Game style list of
+    spots from scratch.
+    """
+    answer = 0
+    square = 0
+    for row in spots:
+        for element in row:
+            answer ^= FLIPPED_KEYS[element][square]
+            square += 1
+    return answer
+
+
+def get_side_key(board_key, player_turn):
+    """
+    Gets the key for a state key with the given player to move.
+    """
+    return board_key ^ SIDE_KEY if player_turn else board_key
+
+
+def get_canonical_key(board_key, flipped_key, player_turn):
+    """
+    Gets the key, with player 1 to move, of whichever of a board and its flipped board
+    plays the same as the given board with the given player to move.
+    """
+    return (board_key if player_turn else flipped_key) ^ SIDE_KEY
+
+
+def hash_decimal_key(board_key):
+    """
+    Converts an old style state key (one decimal digit per square, leading empty
+    squares dropped) to the matching Zobrist state key.
+    """
+    board_key = str(board_key).zfill(NUM_SQUARES)
+    answer = 0
+    for square in range(NUM_SQUARES):
+        answer ^= PIECE_KEYS[int(board_key[square])][square]
+    return answer
+
+
+def convert_table_keys(table):
+    """
+    Gets a copy of a dictionary keyed by old style decimal state keys, keyed by
+    Zobrist state keys instead. Used to migrate pickled Q-tables and teacher tables.
+    """
+    return {hash_decimal_key(board_key): value for board_key, value in table.items()}
@@ -0,0 +1,40 @@
+"""
+Strips the zero valued entries from agent pickles, which agents trained before their
+tables stopped storing unread zeros are full of, and rewrites the files in place.
+Checkers agents' Q-tables become sparse (see checkerstools/qtable.py). Tic-tac-toe and
+Connect Four agent pickles can be compacted too, by running the script from their folder
+so their agent classes can be loaded:
+
+    python compactagent.py -a q_agent.pkl
+    cd ../connectfour && python ../checkers/compactagent.py -a q_agent.pkl
+"""
+
+
+import argparse
+import os
+import pickle
+import sys
+
+# Pickles name their agent's module, which is found relative to the game's folder
+sys.path.insert(0, os.getcwd())
+
+
+def compact_agent(path):
+    with open(path, 'rb') as f:
+        agent = pickle.load(f)
+    size_before = os.path.getsize(path)
+    removed = agent.compact()
+    agent.save(path)
+    print(f"Removed {removed} zero entries from {path}: {size_before / 2**20:.1f} MB -> "
+          f"{os.path.getsize(path) / 2**20:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Strip zero valued entries from agent pickles.")
+    parser.add_argument("-a", "--agents", nargs='*', default=['q_agent.pkl', 'sarsa_agent.pkl', 'mcon_agent.pkl', 'mcoff_agent.pkl'],
+                        help="Agent pickle files to compact. Missing files are skipped.")
+    args = parser.parse_args()
+
+    for path in args.agents:
+        if os.path.isfile(path):
+            compact_agent(path)
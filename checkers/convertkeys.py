@@ -0,0 +1,52 @@
+"""
+Migrates pickles written before state keys were Zobrist keys and moves were int codes.
+Agent pickles have the state and action keys of their Q (and C) tables converted and are
+moved into a QTable (see checkerstools/qtable.py), and checkers_table{depth}.pkl teacher
+tables have their keys converted. Files are rewritten in place.
+"""
+
+
+import argparse
+import os
+import pickle
+
+from checkerstools.moves import convert_action_keys
+from checkerstools.qtable import QTable
+from checkerstools.zobrist import convert_table_keys
+
+
+def convert_agent(path):
+    with open(path, 'rb') as f:
+        agent = pickle.load(f)
+    if isinstance(agent.Q, dict):
+        Q = {s: convert_action_keys(actions) for s, actions in convert_table_keys(agent.Q).items()}
+        C = {s: convert_action_keys(actions) for s, actions in convert_table_keys(agent.C).items()}
+        agent.Q = QTable.from_dicts(Q, C)
+        del agent.C
+    agent.save(path)
+    print(f"Converted {len(agent.Q)} states in {path}")
+
+
+def convert_teacher_table(path):
+    with open(path, 'rb') as f:
+        moves_dict = pickle.load(f)
+    moves_dict = convert_table_keys(moves_dict)
+    with open(path, 'wb') as handle:
+        pickle.dump(moves_dict, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    print(f"Converted {len(moves_dict)} boards in {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert checkers pickles to Zobrist state keys and move codes.")
+    parser.add_argument("-a", "--agents", nargs='*', default=['q_agent.pkl', 'sarsa_agent.pkl', 'mcon_agent.pkl', 'mcoff_agent.pkl'],
+                        help="Agent pickle files to convert. Missing files are skipped.")
+    parser.add_argument("-t", "--tables", nargs='*', default=[f'checkers_table{depth}.pkl' for depth in range(1, 6)],
+                        help="Teacher table pickle files to convert. Missing files are skipped.")
+    args = parser.parse_args()
+
+    for path in args.agents:
+        if os.path.isfile(path):
+            convert_agent(path)
+    for path in args.tables:
+        if os.path.isfile(path):
+            convert_teacher_table(path)
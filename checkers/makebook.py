@@ -0,0 +1,126 @@
+"""
+Builds the checkers teacher's opening book (see checkerstools/openingbook.py): every
+position with the teacher to move within a number of plies of the start is searched to
+a fixed depth, spread over worker processes, and the best moves are written to a file
+the teacher looks moves up in before searching.
+
+    python makebook.py -p 4 -d 8 -w 4
+    python play.py -a q -t 5000 -k checkers_book.bin
+"""
+
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from checkerstools.game import Game
+from checkerstools.openingbook import DEFAULT_PATH, MAGIC, VERSION, HEADER, RECORD
+from checkerstools.teacher import Alpha_beta, Board
+from checkerstools.zobrist import get_side_key
+
+P_TOKENS = [Game.P1, Game.P1_K, Game.P2, Game.P2_K, Game.EMPTY_SPOT]
+DIMENSIONS = [Game.HEIGHT, Game.WIDTH]
+
+
+def expand_openings(plies):
+    """
+    Gets {key: decimal board key} for every position with player 1 to move and at least
+    one move, which can be reached from the start position within the given number of
+    plies with either side moving first.
+    """
+    start_key = Game(None).get_decimal_key()
+    positions = {}
+    seen = set()
+    frontier = [(start_key, True), (start_key, False)]
+    for ply in range(plies + 1):
+        next_frontier = []
+        for decimal_key, player_turn in frontier:
+            board = Board(P_TOKENS, DIMENSIONS, decimal_key, 0, player_turn)
+            key = get_side_key(board.zobrist_key, player_turn)
+            if key in seen:
+                continue
+            seen.add(key)
+            moves = board.get_possible_next_moves()
+            if player_turn and moves:
+                positions[key] = decimal_key
+            if ply == plies:
+                continue
+            for move in moves:
+                record = board.make_move(move)
+                next_frontier.append((board.get_state_key(board.spots), board.player_turn))
+                board.unmake_move(record)
+        frontier = next_frontier
+    return positions
+
+
+# The Alpha_beta each worker process searches with, set up once per worker by init_worker
+worker_teacher = None
+
+
+def init_worker(tablebase_path):
+    global worker_teacher
+    worker_teacher = Alpha_beta(level=1.0, use_dict=False, tablebase_path=tablebase_path)
+    worker_teacher.p_tokens = P_TOKENS
+    worker_teacher.dimensions = DIMENSIONS
+
+
+def search_position(key, decimal_key, depth):
+    """
+    Searches one book position with player 1 to move and returns (key, move, value, nodes).
+    """
+    teacher = worker_teacher
+    # Start every position from scratch, so the book does not depend on how the
+    # positions were shared out between the workers
+    teacher.transposition_table.clear()
+    teacher.history = {}
+    teacher.new_search()
+    value, move = teacher.alpha_beta(decimal_key, depth, float('-inf'), float('inf'), True)
+    return key, move, value, teacher.tested_states
+
+
+def build_book(plies, depth, workers=1, path=DEFAULT_PATH, tablebase_path=None):
+    """
+    Searches every book position within plies of the start to the given depth, over the
+    given number of worker processes, and writes the book to path.
+    """
+    positions = expand_openings(plies)
+    print(f"{len(positions)} positions within {plies} plies")
+    jobs = list(zip(*[(key, decimal_key, depth) for key, decimal_key in positions.items()]))
+    start_time = time.perf_counter()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(tablebase_path,)) as executor:
+            results = list(executor.map(search_position, *jobs))
+    else:
+        init_worker(tablebase_path)
+        results = list(map(search_position, *jobs))
+    elapsed = time.perf_counter() - start_time
+    nodes = sum(result[3] for result in results)
+    print(f"Searched {nodes} nodes to depth {depth} in {elapsed:.1f}s "
+          f"({nodes / elapsed if elapsed > 0 else 0:,.0f} nodes/sec)")
+
+    # A decided position's search can end without a move, and there is nothing to store for it
+    records = sorted(result[:3] for result in results if result[1] is not None)
+    if len(records) < len(results):
+        print(f"Skipped {len(results) - len(records)} positions without a move")
+    with open(path, 'wb') as handle:
+        handle.write(HEADER.pack(MAGIC, VERSION, plies, depth, len(records)))
+        for record in records:
+            handle.write(RECORD.pack(*record))
+    print(f"Wrote {len(records)} positions to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the checkers teacher's opening book.")
+    parser.add_argument("-p", "--plies", type=int, default=4,
+                        help="Number of plies from the start position to expand.")
+    parser.add_argument("-d", "--depth", type=int, default=8,
+                        help="Depth to search each position to.")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Number of processes to search with.")
+    parser.add_argument("-e", "--tablebase", type=str, default=None,
+                        help="Endgame tablebase for the searches to use.")
+    parser.add_argument("-o", "--output", type=str, default=DEFAULT_PATH,
+                        help="File to write the book to.")
+    args = parser.parse_args()
+
+    build_book(args.plies, args.depth, args.workers, args.output, args.tablebase)
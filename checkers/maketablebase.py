@@ -0,0 +1,26 @@
+"""
+Solves every checkers position with up to a given number of pieces and writes the
+endgame tablebase the teacher can probe (see checkerstools/tablebase.py).
+
+    python maketablebase.py -n 4
+    python play.py -a q -t 5000 -e checkers_tablebase.bin
+"""
+
+
+import argparse
+import time
+
+from checkerstools.tablebase import generate, DEFAULT_PATH
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a checkers endgame tablebase.")
+    parser.add_argument("-n", "--pieces", type=int, default=3,
+                        help="Largest number of pieces on the board to solve.")
+    parser.add_argument("-o", "--output", type=str, default=DEFAULT_PATH,
+                        help="File to write the tablebase to.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    generate(args.pieces, args.output, verbose=True)
+    print(f"Wrote {args.output} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,145 @@
+"""
+perft for the checkers move generators. Counts the leaf nodes of the move tree to a
+given depth from the opening position and from a fixed set of midgame and endgame
+positions, times every move generator backend on them, and walks the tree checking
+that every backend gives exactly the same move lists as the list based reference.
+
+Run it after any change to move generation in checkerstools, e.g.:
+
+    python perft.py -d 6
+    python perft.py -d 4 -b bitboard teacher --no-diff
+"""
+
+
+import argparse
+import sys
+import time
+
+from checkerstools.game import Game
+from checkerstools.moves import decode_move
+from checkerstools.teacher import Board
+
+P_TOKENS = [Game.P1, Game.P1_K, Game.P2, Game.P2_K, Game.EMPTY_SPOT]
+DIMENSIONS = [Game.HEIGHT, Game.WIDTH]
+REFERENCE = 'list'
+
+# name: (decimal board key, player_turn)
+POSITIONS = {
+    'opening': (11111111111100000000222222222222, True),
+    'midgame_jumps': (11110001100001000000012100222222, False),
+    'midgame_kings': (14000140010100010220000220002022, True),
+    'endgame_mixed': (10001001140000030, True),
+    'endgame_kings': (40020000000000010000000303000, True),
+}
+
+
+def spots_from_key(board_key):
+    """
+    Gets Game style spots from a decimal board key.
+    """
+    board_key = str(board_key).zfill(Game.HEIGHT * Game.WIDTH)
+    return [[int(board_key[j * Game.WIDTH + i]) for i in range(Game.WIDTH)] for j in range(Game.HEIGHT)]
+
+
+BACKENDS = {
+    'list': lambda key, turn: Game(None, old_spots=spots_from_key(key), player_turn=turn, use_bitboard=False),
+    'bitboard': lambda key, turn: Game(None, old_spots=spots_from_key(key), player_turn=turn),
+    'teacher': lambda key, turn: Board(P_TOKENS, DIMENSIONS, key, 0, turn),
+    'teacher-list': lambda key, turn: Board(P_TOKENS, DIMENSIONS, key, 0, turn, False),
+}
+
+
+def perft(board, depth):
+    """
+    Counts the leaf nodes of the move tree below the board to the given depth.
+    Positions with no moves left are not counted as leaves.
+    """
+    if depth == 0:
+        return 1
+    moves = board.get_possible_next_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        record = board.make_move(move)
+        nodes += perft(board, depth - 1)
+        board.unmake_move(record)
+    return nodes
+
+
+def diff_tree(boards, depth, mismatches, max_mismatches=5):
+    """
+    Walks the move tree of the reference board to the given depth, making the same moves
+    on every other board, and adds an entry to mismatches for every position where a
+    board's move list differs from the reference's.
+    """
+    reference_moves = boards[REFERENCE].get_possible_next_moves()
+    for name, board in boards.items():
+        if name != REFERENCE:
+            moves = board.get_possible_next_moves()
+            if moves != reference_moves:
+                reference = boards[REFERENCE]
+                mismatches.append((name, reference.get_decimal_key(), reference.player_turn, reference_moves, moves))
+    if depth <= 1 or len(mismatches) >= max_mismatches:
+        return
+    for move in reference_moves:
+        records = {name: board.make_move(move) for name, board in boards.items()}
+        diff_tree(boards, depth - 1, mismatches, max_mismatches)
+        for name, board in boards.items():
+            board.unmake_move(records[name])
+        if len(mismatches) >= max_mismatches:
+            return
+
+
+def run(positions, depth, backends, check_moves):
+    """
+    Prints the perft counts and nodes/sec for every position and backend, and returns
+    False if any counts or move lists disagree with the reference.
+    """
+    all_match = True
+    for position in positions:
+        board_key, player_turn = POSITIONS[position]
+        print(f"{position} ({'player 1' if player_turn else 'player 2'} to move)")
+        for d in range(1, depth + 1):
+            counts = {}
+            line = f"  depth {d}:"
+            for name in backends:
+                board = BACKENDS[name](board_key, player_turn)
+                start = time.perf_counter()
+                counts[name] = perft(board, d)
+                elapsed = time.perf_counter() - start
+                line += f"  {name} {counts[name]} ({counts[name] / elapsed if elapsed > 0 else 0:,.0f} nodes/sec)"
+            print(line)
+            if len(set(counts.values())) > 1:
+                all_match = False
+                print(f"  COUNT MISMATCH at depth {d}: {counts}")
+
+        if check_moves:
+            boards = {name: BACKENDS[name](board_key, player_turn) for name in set(backends) | {REFERENCE}}
+            mismatches = []
+            diff_tree(boards, depth, mismatches)
+            for name, mismatch_key, mismatch_turn, reference_moves, moves in mismatches:
+                all_match = False
+                print(f"  MOVE MISMATCH for {name} at board {mismatch_key} "
+                      f"({'player 1' if mismatch_turn else 'player 2'} to move)")
+                print(f"    {REFERENCE}: {[decode_move(move) for move in reference_moves]}")
+                print(f"    {name}: {[decode_move(move) for move in moves]}")
+            if not mismatches:
+                print(f"  move lists match {REFERENCE} to depth {depth}")
+    return all_match
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count and check checkers move generation.")
+    parser.add_argument("-d", "--depth", type=int, default=5,
+                        help="Depth to count leaf nodes to.")
+    parser.add_argument("-p", "--positions", nargs='*', default=list(POSITIONS), choices=list(POSITIONS),
+                        help="Positions to start from.")
+    parser.add_argument("-b", "--backends", nargs='*', default=list(BACKENDS), choices=list(BACKENDS),
+                        help="Move generators to time and check against the list reference.")
+    parser.add_argument("--no-diff", action="store_true",
+                        help="Only count and time, do not compare move lists at every node.")
+    args = parser.parse_args()
+
+    if not run(args.positions, args.depth, args.backends, not args.no_diff):
+        sys.exit(1)
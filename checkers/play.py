@@ -5,9 +5,11 @@ import pickle
 import sys
 import time
 
-from checkerstools.agent import Qlearner, SARSAlearner, MCOffPolicyLearner, MCOnPolicyLearner
+from checkerstools.agent import Qlearner, SARSAlearner, MCOffPolicyLearner, MCOnPolicyLearner, LinearQlearner, LinearSARSAlearner
 from checkerstools.teacher import Alpha_beta as Teacher
 from checkerstools.game import Game
+from checkerstools.searchstats import SearchStats
+from checkerstools.sharedcache import DEFAULT_NAME as SHARED_CACHE_NAME
 
 
 class GameLearning(object):
@@ -40,18 +42,31 @@ class GameLearning(object):
                     else:
                         print("Invalid input. Please choose 'y' or 'n'.")
             if args.agent_type == "q":
-                agent = Qlearner(alpha,gamma,epsilon,self.eps_decay)
+                agent = Qlearner(alpha,gamma,epsilon,self.eps_decay,args.sparse)
             elif args.agent_type == "mcon":
-                agent = MCOnPolicyLearner(alpha,gamma,epsilon,self.eps_decay)
+                agent = MCOnPolicyLearner(alpha,gamma,epsilon,self.eps_decay,args.sparse)
             elif args.agent_type == "mcoff":
-                agent = MCOffPolicyLearner(alpha,gamma,epsilon,self.eps_decay)
+                agent = MCOffPolicyLearner(alpha,gamma,epsilon,self.eps_decay,args.sparse)
+            elif args.agent_type == "lq":
+                agent = LinearQlearner(alpha,gamma,epsilon,self.eps_decay)
+            elif args.agent_type == "ls":
+                agent = LinearSARSAlearner(alpha,gamma,epsilon,self.eps_decay)
             else:
-                agent = SARSAlearner(alpha,gamma,epsilon,self.eps_decay)
+                agent = SARSAlearner(alpha,gamma,epsilon,self.eps_decay,args.sparse)
 
         self.games_played = 0
         self.path = args.path
         self.agent = agent
         self.agent_type = args.agent_type
+        self.teacher_budget = args.teacher_budget
+        self.teacher_workers = args.teacher_workers
+        self.teacher_cache = args.teacher_cache
+        self.tablebase = args.tablebase
+        self.book = args.book
+        self.search_log = args.search_log
+        self.teacher_ponder = args.teacher_ponder
+        self.shared_cache = args.shared_cache
+        self.move_store = args.move_store
 
     def begin_playing(self):
         """ Loop through game iterations with a human player. """
@@ -82,9 +97,12 @@ class GameLearning(object):
         # Teacher parameters
         depth = 1
         level = 0.5
-        use_dict = False
+        use_dict = self.move_store
         # Teacher starts off at low depth, this increases over time
-        teacher = Teacher(depth=depth, level=level, use_dict=use_dict)
+        teacher = Teacher(depth=depth, level=level, use_dict=use_dict, time_budget_ms=self.teacher_budget,
+                          workers=self.teacher_workers, cache_entries=self.teacher_cache,
+                          tablebase_path=self.tablebase, book_path=self.book, ponder=self.teacher_ponder,
+                          shared_cache=self.shared_cache)
         teacher.agent_id = self.agent_type
         teacher.load_moves_dict()
         print(f"Training agent {self.agent_type} for {episodes} episodes")
@@ -106,6 +124,8 @@ class GameLearning(object):
             if self.games_played % 1000 == 0:
                 # Save teacher and agent
                 teacher.save_moves_dict()
+                self.print_teacher_cache(teacher)
+                self.log_search(teacher, 'train')
                 self.agent.save(self.path)
                 # Run random and optimal tests
                 self.run_diag(True, teacher)
@@ -125,14 +145,44 @@ class GameLearning(object):
             if self.games_played % 100 == 0:
                 print("Games played: %i" % self.games_played)
 
+        self.print_teacher_cache(teacher)
+        self.log_search(teacher, 'train')
+        teacher.close()
         self.agent.train_time = time.perf_counter() - train_time
         print(f"Training time: {self.agent.train_time}")
+        usage = self.agent.get_memory_usage()
+        if 'states' in usage:
+            print(f"Q-table: {usage['states']} states, {usage['entries']} values, "
+                  f"{usage['unused']} unused, {usage['total_bytes'] / 2**20:.1f} MB")
+        else:
+            print(f"Weights: {usage['weights']} values, {usage['total_bytes'] / 2**10:.1f} KB")
+        if teacher.book is not None:
+            print(f"Teacher book moves: {teacher.book_hits}")
         # save final agent
         self.agent.save(self.path)
         print(f"The agent won {self.agent.num_wins} times")
         print(f"The agent lost {self.agent.num_losses} times")
         print(f"The agent drew {self.agent.num_draws} times")
 
+    def print_teacher_cache(self, teacher):
+        """ Print the hit rate of the teacher's in-memory move cache, if it has one. """
+        stats = teacher.get_cache_stats()
+        if stats is not None:
+            print(f"Teacher cache hits: {stats['hits']}, misses: {stats['misses']}, "
+                  f"evictions: {stats['evictions']}, hit rate: {stats['hit_rate']:.1%}, "
+                  f"entries: {stats['entries']}")
+            if 'shared_hits' in stats:
+                print(f"Shared cache hits: {stats['shared_hits']}, misses: {stats['shared_misses']}, "
+                      f"hit rate: {stats['shared_hit_rate']:.1%}, overwrites: {stats['shared_overwrites']}")
+
+    def log_search(self, teacher, phase):
+        """ Append the teacher's search statistics since the last call to the search log as a JSON line. """
+        if self.search_log is not None and teacher.search_stats.moves:
+            teacher.search_stats.write_json_line(self.search_log, phase=phase, agent=self.agent_type,
+                                                 games_played=self.games_played, depth=teacher.depth,
+                                                 level=teacher.level, time=time.time())
+        teacher.search_stats = SearchStats()
+
     def run_diag(self, is_rand, test_teacher):
 #        gc.collect()
         print(f"Running test with {'random' if is_rand else 'optimal'} teacher")
@@ -158,6 +208,7 @@ class GameLearning(object):
             game = Game(self.agent, teacher=test_teacher)
             game.start()
             i += 1
+        self.log_search(test_teacher, 'test_random' if is_rand else 'test_optimal')
         test_res = [self.agent.num_wins, self.agent.num_losses, self.agent.num_draws]
 #        self.agent = None
 #        with open(self.path, 'rb') as f:
@@ -192,12 +243,14 @@ if __name__ == "__main__":
     # Parse command line arguments
     parser = argparse.ArgumentParser(description="Play Tic-Tac-Toe.")
     parser.add_argument('-a', "--agent_type", type=str, default="q",
-                        choices=['q', 's', 'mcon', 'mcoff'],
+                        choices=['q', 's', 'mcon', 'mcoff', 'lq', 'ls'],
                         help="Specify the computer agent learning algorithm. "
                              "AGENT_TYPE='q' for Q-learning, AGENT_TYPE='s' "
                              "for Sarsa-learning, AGENT_TYPE='mcoff' for "
-                             "Monte Carlo off-policy, and AGENT_TYPE='mcon' "
-                             "for Monte Carlo on-policy.")
+                             "Monte Carlo off-policy, AGENT_TYPE='mcon' "
+                             "for Monte Carlo on-policy, and AGENT_TYPE='lq' "
+                             "or 'ls' for Q-learning or Sarsa-learning with "
+                             "linear function approximation.")
     parser.add_argument("-p", "--path", type=str, required=False,
                         help="Specify the path for the agent pickle file. "
                              "Defaults to q_agent.pkl for AGENT_TYPE='q', "
@@ -206,9 +259,45 @@ if __name__ == "__main__":
                              "for AGENT_TYPE='s'.")
     parser.add_argument("-l", "--load", action="store_true",
                         help="whether to load trained agent")
+    parser.add_argument("-z", "--sparse", action="store_true",
+                        help="only store the Q-values of a new agent which have "
+                             "been updated, instead of every legal move of every "
+                             "state it has seen")
     parser.add_argument("-t", "--teacher_episodes", default=None, type=int,
                         help="employ teacher agent who knows the optimal "
                              "strategy and will play for TEACHER_EPISODES games")
+    parser.add_argument("-b", "--teacher_budget", default=None, type=int,
+                        help="give the teacher TEACHER_BUDGET milliseconds per move, "
+                             "searching as deep as it can in that time, instead of "
+                             "the fixed depth schedule")
+    parser.add_argument("-w", "--teacher_workers", default=1, type=int,
+                        help="split the teacher's fixed depth searches over "
+                             "TEACHER_WORKERS processes")
+    parser.add_argument("-m", "--move_store", action="store_true",
+                        help="keep the teacher's results in the move store "
+                             "checkers_moves.db and look moves up there before "
+                             "searching")
+    parser.add_argument("-c", "--teacher_cache", default=100000, type=int,
+                        help="keep up to TEACHER_CACHE of the teacher's stored "
+                             "moves in memory. Only used with -m or -s, which "
+                             "give the teacher somewhere to store them")
+    parser.add_argument("-e", "--tablebase", default=None, type=str,
+                        help="let the teacher look up endgames in the TABLEBASE "
+                             "file made by maketablebase.py")
+    parser.add_argument("-k", "--book", default=None, type=str,
+                        help="let the teacher look up opening moves in the BOOK "
+                             "file made by makebook.py")
+    parser.add_argument("-n", "--teacher_ponder", action="store_true",
+                        help="let the teacher search the agent's likely replies "
+                             "in a background process while the agent moves")
+    parser.add_argument("-s", "--shared_cache", nargs='?', default=None, const=SHARED_CACHE_NAME,
+                        help="share the teacher's results with other trainers on "
+                             "this machine through the shared memory table "
+                             "SHARED_CACHE (checkers_teacher_cache if no name is given)")
+    parser.add_argument("-j", "--search_log", default=None, type=str,
+                        help="append the teacher's search statistics for every "
+                             "block of training games and every test to the JSON "
+                             "lines file SEARCH_LOG")
     args = parser.parse_args()
 
     # set default path
@@ -220,6 +309,10 @@ if __name__ == "__main__":
                 args.path = 'mcon_agent.pkl'
             case 'mcoff':
                 args.path = 'mcoff_agent.pkl'
+            case 'lq':
+                args.path = 'lq_agent.pkl'
+            case 'ls':
+                args.path = 'ls_agent.pkl'
             case _:
                 args.path = 'sarsa_agent.pkl'
     init_game(args)
\ No newline at end of file
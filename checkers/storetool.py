@@ -0,0 +1,74 @@
+"""
+Manages the teacher's move store (checkers_moves.db by default). Imports old
+checkers_table{depth}.pkl pickles into it, shows how many results it holds at each
+depth, and compacts it. It is safe to run while trainers are using the store. Also
+shows how full the shared memory table trainers share results through is, and removes
+it.
+
+    python storetool.py import
+    python storetool.py stats
+    python storetool.py compact
+    python storetool.py shared
+    python storetool.py unshare
+"""
+
+
+import argparse
+import os
+import sys
+
+from checkerstools.movestore import MoveStore, DEFAULT_PATH
+from checkerstools.sharedcache import SharedMoveCache, DEFAULT_NAME, remove_table
+
+
+def import_tables(store, tables):
+    for depth, path in tables:
+        if os.path.isfile(path):
+            print(f"Imported {store.import_pickle(path, depth)} boards from {path} at depth {depth}")
+
+
+def print_stats(store, depths):
+    for depth in depths:
+        print(f"depth {depth}: {store.count(depth)} boards")
+    print(f"total: {store.count()} boards, {store.get_size():,} bytes on disk")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the checkers teacher's move store.")
+    parser.add_argument("command", choices=['import', 'stats', 'compact', 'shared', 'unshare'],
+                        help="import: read checkers_table{depth}.pkl files into the store. "
+                             "stats: count the stored results. compact: shrink the store's files. "
+                             "shared: count the results in the shared memory table. "
+                             "unshare: remove the shared memory table.")
+    parser.add_argument("-s", "--store", default=DEFAULT_PATH,
+                        help="Path of the move store.")
+    parser.add_argument("-d", "--depths", nargs='*', type=int, default=list(range(1, 6)),
+                        help="Depths to import or count. Pickles are read from checkers_table{depth}.pkl.")
+    parser.add_argument("-m", "--shared_name", default=DEFAULT_NAME,
+                        help="Name of the shared memory table.")
+    args = parser.parse_args()
+
+    if args.command == 'shared':
+        shared_cache = SharedMoveCache(name=args.shared_name)
+        print(f"{args.shared_name}: {shared_cache.count()} of {shared_cache.size} slots in use")
+        shared_cache.close()
+        sys.exit(0)
+    if args.command == 'unshare':
+        # Also removes tables left by older versions, which SharedMoveCache will not open
+        if remove_table(args.shared_name):
+            print(f"Removed {args.shared_name}")
+        else:
+            print(f"There is no {args.shared_name}")
+        sys.exit(0)
+
+    store = MoveStore(args.store)
+    match args.command:
+        case 'import':
+            import_tables(store, [(depth, f'checkers_table{depth}.pkl') for depth in args.depths])
+        case 'stats':
+            print_stats(store, args.depths)
+        case 'compact':
+            before = store.get_size()
+            store.compact()
+            print(f"Compacted {args.store} from {before:,} to {store.get_size():,} bytes")
+    store.close()
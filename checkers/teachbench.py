@@ -0,0 +1,72 @@
+"""
+Times the checkers teacher's search on the perft positions with different numbers of
+worker processes, reporting nodes/sec and the speedup over one process, and checks that
+every worker count picks the same move as the serial search.
+
+    python teachbench.py -d 6 -w 1 2 4
+"""
+
+
+import argparse
+import sys
+import time
+
+from checkerstools.teacher import Alpha_beta
+from perft import POSITIONS, BACKENDS
+
+
+def search(position, depth, workers):
+    """
+    Searches the position with a fresh teacher using the given number of workers, and
+    returns (value, move, nodes, seconds). The worker processes are started before timing.
+    """
+    board_key, player_turn = POSITIONS[position]
+    game = BACKENDS['bitboard'](board_key, player_turn)
+    teacher = Alpha_beta(level=1.0, depth=depth, use_dict=False, workers=workers)
+    teacher.new_board(game, game.get_state_key())
+    if workers > 1:
+        # Start the pool on a shallow search so process start up is not timed
+        teacher.alpha_beta(teacher.decimal_key, 2, float('-inf'), float('inf'), player_turn)
+        teacher.transposition_table.clear()
+    teacher.new_search()
+    start = time.perf_counter()
+    value, move = teacher.alpha_beta(teacher.decimal_key, depth, float('-inf'), float('inf'), player_turn,
+                                     game.get_possible_next_moves())
+    elapsed = time.perf_counter() - start
+    teacher.close()
+    return value, move, teacher.tested_states, elapsed
+
+
+def run(positions, depth, worker_counts):
+    """
+    Prints the timings for every position and worker count, and returns False if any
+    worker count chose a different move than the serial search.
+    """
+    all_match = True
+    for position in positions:
+        print(f"{position} (depth {depth})")
+        serial = search(position, depth, 1)
+        for workers in worker_counts:
+            value, move, nodes, elapsed = serial if workers == 1 else search(position, depth, workers)
+            line = (f"  {workers} worker{'s' if workers != 1 else ''}: value {value} move {move} nodes {nodes} "
+                    f"({nodes / elapsed if elapsed > 0 else 0:,.0f} nodes/sec, {elapsed:.2f}s, "
+                    f"speedup {serial[3] / elapsed if elapsed > 0 else 0:.2f}x)")
+            if (value, move) != serial[:2]:
+                all_match = False
+                line += f"  MISMATCH with serial {serial[:2]}"
+            print(line)
+    return all_match
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the checkers teacher with worker processes.")
+    parser.add_argument("-d", "--depth", type=int, default=6,
+                        help="Depth to search each position to.")
+    parser.add_argument("-p", "--positions", nargs='*', default=list(POSITIONS), choices=list(POSITIONS),
+                        help="Positions to search.")
+    parser.add_argument("-w", "--workers", nargs='*', type=int, default=[1, 2, 4],
+                        help="Worker counts to time.")
+    args = parser.parse_args()
+
+    if not run(args.positions, args.depth, args.workers):
+        sys.exit(1)
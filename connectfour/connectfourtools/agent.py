@@ -60,16 +60,16 @@ class Learner:
         """
         using_mirror = False
         try:
-            values = np.array([self.Q[a][s] for a in possible_actions])
+            values = np.array([self.Q[a].get(s, 0) for a in possible_actions])
         except KeyError:
             try:
-                values = np.array([self.Q[a][m_s] for a in possible_actions])
+                values = np.array([self.Q[a].get(m_s, 0) for a in possible_actions])
                 using_mirror = True
             except KeyError:
                 self.Q[s] = {}
                 for a in possible_actions:
                     self.Q[a][s] = 0
-                values = np.array([self.Q[a][s] for a in possible_actions])
+                values = np.array([self.Q[a].get(s, 0) for a in possible_actions])
         # Find location of max
         ix_max = np.where(values == np.max(values))[0]
         if random.random() < self.eps:
@@ -101,6 +101,19 @@ class Learner:
             cum_reward += gamma ** (tau - t) * rewards[tau]
         return cum_reward
 
+    def compact(self):
+        """
+        Strips the zero valued entries from the Q and C tables. Lookups give zero for
+        them anyway. Returns the number of entries removed.
+        """
+        removed = 0
+        for table in (self.Q, self.C):
+            for action, values in table.items():
+                kept = collections.defaultdict(int, {s: v for s, v in values.items() if v != 0})
+                removed += len(values) - len(kept)
+                table[action] = kept
+        return removed
+
     def save(self, path):
         """ Pickle the agent object instance to save the agent's state. """
         if os.path.isfile(path):
@@ -153,7 +166,7 @@ class Qlearner(Learner):
         # Update Q(s,a)
         if s_ is not None:
             # hold list of Q values for all a_,s_ pairs. We will access the max later
-            Q_options = [self.Q[action][s_] for action in possible_actions]
+            Q_options = [self.Q[action].get(s_, 0) for action in possible_actions]
             
             # update
             self.Q[a][s] += self.alpha*(r + self.gamma*max(Q_options) - self.Q[a][s])
@@ -198,7 +211,7 @@ class SARSAlearner(Learner):
 
         # Update Q(s,a)
         if s_ is not None:
-            self.Q[a][s] += self.alpha*(r + self.gamma*self.Q[a_][s_] - self.Q[a][s])
+            self.Q[a][s] += self.alpha*(r + self.gamma*self.Q[a_].get(s_, 0) - self.Q[a][s])
         else:
             # terminal state update
             self.Q[a][s] += self.alpha*(r - self.Q[a][s])
@@ -241,7 +254,7 @@ class MCOffPolicyLearner(Learner):
         self.trajectory.append([a,s])
         if s_ is not None:
             # hold list of Q values for all a_,s_ pairs. We will access the max later
-            Q_options = [self.Q[action][s_] for action in possible_actions]
+            Q_options = [self.Q[action].get(s_, 0) for action in possible_actions]
             # update target trajectory
             max_Q = max(Q_options)
             traj = []
@@ -1,8 +1,37 @@
 import numpy as np
 import copy
 import math
+import random
 from functools import reduce 
 
+# Checkers Q-tables are keyed by Zobrist state keys. These must be built exactly as in
+# checkers/checkerstools/zobrist.py so the keys match the trained agents.
+ZOBRIST_SEED = 20240417
+_zobrist_generator = random.Random(ZOBRIST_SEED)
+ZOBRIST_PIECE_KEYS = [[0] * 32] + [[_zobrist_generator.getrandbits(64) for _ in range(32)] for piece in range(4)]
+
+def get_zobrist_key(board_key):
+    """
+    Gets the Zobrist state key for a checkers board given as a decimal board key.
+    """
+    board_key = str(board_key).zfill(32)
+    answer = 0
+    for square in range(32):
+        answer ^= ZOBRIST_PIECE_KEYS[int(board_key[square])][square]
+    return answer
+
+def get_move_code(move):
+    """
+    Gets the move code for a checkers move given as a list of [row, col] locations. These
+    must be built exactly as in checkers/checkerstools/moves.py, since Q-tables key on them.
+    """
+    code = len(move) - 2
+    shift = 4
+    for loc in move:
+        code |= (loc[0] * 4 + loc[1]) << shift
+        shift += 5
+    return code
+
 class Agent:
     def __init__(self, game):
         # Possible actions correspond to the set of all x,y coordinate pairs
@@ -38,7 +67,8 @@ class Agent:
         """
         # Only consider the allowed actions (empty board spaces)
         possible_actions = [a for a in self.actions if s[a[0]*3 + a[1]] == '-']
-        values = np.array([self.Q[a][s] for a in possible_actions])
+        # Compacted tables leave out zero values, which are read as zero
+        values = np.array([self.Q.get(a, {}).get(s, 0) for a in possible_actions])
         # Find location of max
         ix_max = np.where(values == np.max(values))[0]
         # Greedy choose.
@@ -63,15 +93,14 @@ class Agent:
         """
         # get possible actions
         possible_actions = self.get_possible_moves_ch(s)
+        s = get_zobrist_key(s)
 
         # Find optimal action
-        try:
-            values = np.array([self.Q[s][tuple([tuple(a[0]), tuple(a[1])])] for a in possible_actions])
-        except KeyError:
-            self.Q[s] = {}
-            for a in possible_actions:
-                self.Q[s][tuple([tuple(a[0]), tuple(a[1])])] = 0
-            values = np.array([self.Q[s][tuple([tuple(a[0]), tuple(a[1])])] for a in possible_actions])
+        codes = [get_move_code(a) for a in possible_actions]
+        # Sparse and compacted tables only hold the actions whose values changed, and
+        # states never seen are missing altogether; both are read as zero
+        row = self.Q.get(s, {})
+        values = np.array([row.get(a, 0) for a in codes])
         # Find location of max
         ix_max = np.where(values == np.max(values))[0]
         # Greedy choose.
@@ -299,19 +328,16 @@ class Agent:
         # Get possible actions
         possible_actions = self.get_possible_moves_c4(board)
         # Find optimal action
+        # Compacted tables leave out zero values, so a state counts as seen if any of
+        # its actions is there, and missing ones are read as zero
         using_mirror = False
-        try:
-            values = np.array([self.Q[a][s] for a in possible_actions])
-        except KeyError:
+        key = s
+        if not any(s in self.Q.get(a, {}) for a in possible_actions):
             m_s = self.get_mirrored_key(board)
-            try:
-                values = np.array([self.Q[a][m_s] for a in possible_actions])
+            if any(m_s in self.Q.get(a, {}) for a in possible_actions):
+                key = m_s
                 using_mirror = True
-            except KeyError:
-                self.Q[s] = {}
-                for a in possible_actions:
-                    self.Q[a][s] = 0
-                values = np.array([self.Q[a][s] for a in possible_actions])
+        values = np.array([self.Q.get(a, {}).get(key, 0) for a in possible_actions])
         # Find location of max
         ix_max = np.where(values == np.max(values))[0]
         # Greedy choose.
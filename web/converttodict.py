@@ -6,4 +6,5 @@ for i in name:
         agent = pickle.load(f)
 
     with open(f'Dictionaries/{i}', 'wb') as f:
-        pickle.dump(agent.Q, f)
\ No newline at end of file
+        # Checkers agents keep their Q-values in a QTable, which the web app reads as dictionaries
+        pickle.dump(agent.Q.to_dict() if hasattr(agent.Q, 'to_dict') else agent.Q, f)
\ No newline at end of file